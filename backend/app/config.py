@@ -1,15 +1,138 @@
+from ipaddress import IPv4Network, IPv6Network, ip_address, ip_network
+from typing import Literal
+
 from pydantic_settings import BaseSettings
 
 
 class Settings(BaseSettings):
+    # One or more ComfyUI instances, comma-separated. The first one is the
+    # node whose output directory is shared at comfyui_output_dir.
     comfyui_url: str = "http://comfyui:8890"
     image_output_dir: str = "/app/images"
+    # ComfyUI's output directory as mounted in this container (docker-compose
+    # shares it read-only). "link" hands finished files over from there
+    # without copying; "http" always downloads them through /view.
+    comfyui_output_dir: str = "/comfyui-output"
+    image_storage_mode: Literal["link", "http"] = "link"
+    # Read size when streaming images from ComfyUI over HTTP
+    image_chunk_size: int = 64 * 1024
     cors_origins: str = "http://localhost:8888,http://localhost:5173"
+    # Peers allowed to name the client in X-Real-IP (addresses or CIDR ranges,
+    # comma-separated); requests from anyone else are keyed by their own address
+    trusted_proxies: str = "127.0.0.1"
+
+    # ComfyUI HTTP connection pool
+    comfyui_max_connections: int = 20
+    comfyui_max_keepalive: int = 10
+    comfyui_keepalive_expiry: float = 30.0
+    comfyui_connect_timeout: float = 5.0
+    comfyui_read_timeout: float = 30.0
+
+    # Background health checks of each node (/system_stats and /queue)
+    comfyui_health_interval: float = 5.0
+    comfyui_eject_after: int = 3
+    # A tracked prompt silent this long is looked up in ComfyUI's queue and history
+    comfyui_watchdog_interval: float = 60.0
+
+    # Tiny render submitted to each node whenever its event stream (re)connects,
+    # so the checkpoint and LoRA are in VRAM before the first user render
+    warmup_enabled: bool = True
+    warmup_steps: int = 1
+    warmup_size: int = 64
+    warmup_timeout: float = 600.0
+
+    # Retry with jittered exponential backoff for transient errors
+    comfyui_retries: int = 3
+    comfyui_retry_backoff: float = 0.25
+    comfyui_retry_backoff_max: float = 4.0
+
+    # Circuit breaker: open after N consecutive failures, probe again after reset
+    comfyui_breaker_threshold: int = 5
+    comfyui_breaker_reset: float = 15.0
+
+    # SSE comment sent on idle status streams so proxies keep them open
+    status_heartbeat_interval: float = 15.0
+    # Multiplexed status WebSocket: progress-only changes of one generation are
+    # sent at most once per interval; subscriptions per connection are capped
+    status_ws_progress_interval: float = 0.25
+    status_ws_max_subscriptions: int = 100
+
+    # Live sampler previews (ComfyUI needs --preview-method): at most one frame
+    # per interval per job, downscaled to max_size when Pillow is installed
+    preview_enabled: bool = True
+    preview_interval: float = 0.5
+    preview_max_size: int = 256
+    preview_max_entries: int = 256
+
+    # Derivatives made in a process pool after an image is stored: a JPEG
+    # thumbnail and a lossless WebP sibling (needs Pillow). Images arriving
+    # while max_queue are waiting get none.
+    postprocess_enabled: bool = True
+    postprocess_workers: int = 1
+    postprocess_max_queue: int = 32
+    thumbnail_size: int = 256
+    # Lossless WebP compression effort, 0-100: slower encodes, smaller files
+    webp_effort: int = 80
+
+    # Content-addressed render cache, used when a request sets cache=true
+    render_cache_enabled: bool = True
+    render_cache_max_entries: int = 512
+    render_cache_ttl: float = 24 * 3600
+
+    # Render scheduler: concurrent jobs per ComfyUI node and admission limits
+    scheduler_max_in_flight: int = 2
+    scheduler_max_queue_depth: int = 50
+    scheduler_max_per_client: int = 5
+    # Cache-aware ordering: look this many queued jobs ahead for one with the
+    # same prompt text as the last dispatch (0 disables); bound the reordering
+    scheduler_affinity_window: int = 0
+    scheduler_affinity_max_bypass: int = 3
+
+    # Degrade new jobs to a cheaper render tier while the backlog is over
+    # either threshold (0 disables it); twice over drops them two tiers
+    tier_degrade_queue_depth: int = 0
+    tier_degrade_wait: float = 0.0
+
+    # Generation state: finished jobs leave memory after TTL or past max_entries.
+    # With the sqlite backend they remain queryable from job_store_path.
+    job_store_backend: Literal["memory", "sqlite"] = "memory"
+    job_store_path: str = "/app/images/jobs.sqlite3"
+    job_store_max_entries: int = 10000
+    job_store_ttl: float = 3600.0
+    job_store_persist_ttl: float = 30 * 24 * 3600
+    # Persisted writes are batched per flush; eviction also runs every sweep
+    job_store_flush_interval: float = 0.5
+    job_store_sweep_interval: float = 60.0
+
+    # Unix socket used to share job updates between uvicorn workers on one
+    # host (uvicorn --workers N). Empty disables cross-worker fan-out.
+    broker_socket: str = "/tmp/keyring-gacha-broker.sock"
+    # How long a status stream waits for a job created on another worker
+    status_not_found_grace: float = 2.0
+
+    # Cancel a generation once every status subscriber, on any worker, has
+    # been gone this long (0 disables)
+    auto_cancel_grace: float = 0.0
+
+    @property
+    def comfyui_urls(self) -> list[str]:
+        return [s.strip().rstrip("/") for s in self.comfyui_url.split(",") if s.strip()]
 
     @property
     def cors_origins_list(self) -> list[str]:
         return [s.strip() for s in self.cors_origins.split(",")]
 
+    def is_trusted_proxy(self, host: str) -> bool:
+        try:
+            address = ip_address(host)
+        except ValueError:
+            return False
+        return any(address in network for network in self.trusted_proxy_networks)
+
+    @property
+    def trusted_proxy_networks(self) -> list[IPv4Network | IPv6Network]:
+        return [ip_network(s.strip(), strict=False) for s in self.trusted_proxies.split(",") if s.strip()]
+
     class Config:
         env_file = ".env"
 
@@ -1,4 +1,8 @@
-from pydantic import BaseModel
+from typing import Literal
+
+from pydantic import BaseModel, Field, field_validator
+
+from app.services.catalog import catalog
 
 
 class GachaSpinResponse(BaseModel):
@@ -8,24 +12,106 @@ class GachaSpinResponse(BaseModel):
     icon: str
 
 
+class GachaBulkRequest(BaseModel):
+    count: int = Field(10, ge=1, le=100)
+    # Continue a seeded, replayable draw sequence across calls
+    session_id: str | None = None
+    # Seed for a new session, or for a one-off reproducible pull; continuing
+    # a session with a different seed is rejected (409)
+    seed: int | None = None
+
+
+class GachaBulkResponse(BaseModel):
+    results: list[GachaSpinResponse]
+    session_id: str | None = None
+    seed: int | None = None
+    # Index of the first result in the seeded sequence, for replay
+    first_draw: int = 0
+
+
+def _check_option(value: str, options: dict, kind: str) -> str:
+    if value not in options:
+        raise ValueError(f"unknown {kind} {value!r}")
+    return value
+
+
 class GenerateRequest(BaseModel):
     base_element: str
     potions: list[str]
     shape: str
     pattern: str
     color: str
+    # Fixed sampler seed; identical requests with the same seed render identically.
+    # ComfyUI accepts unsigned 64-bit seeds only.
+    seed: int | None = Field(None, ge=0, le=2**64 - 1)
+    # Reuse an existing or in-flight render of the same workflow when possible
+    cache: bool = False
+    # Number of variants rendered together as one latent batch
+    variants: int = Field(1, ge=1, le=4)
+    # Speed/quality trade-off; may be lowered while the render queue is long
+    tier: Literal["preview", "standard", "high"] = "standard"
+
+    @field_validator("base_element")
+    @classmethod
+    def _known_base_element(cls, value: str) -> str:
+        return _check_option(value, catalog.base_elements, "base element")
+
+    @field_validator("shape")
+    @classmethod
+    def _known_shape(cls, value: str) -> str:
+        return _check_option(value, catalog.shapes, "shape")
+
+    @field_validator("pattern")
+    @classmethod
+    def _known_pattern(cls, value: str) -> str:
+        return _check_option(value, catalog.patterns, "pattern")
+
+    @field_validator("color")
+    @classmethod
+    def _known_color(cls, value: str) -> str:
+        return _check_option(value, catalog.colors, "color")
+
+    @field_validator("potions")
+    @classmethod
+    def _known_potions(cls, value: list[str]) -> list[str]:
+        for potion in value:
+            _check_option(potion, catalog.potions, "potion")
+        # Repeats would only repeat the prompt fragment
+        return list(dict.fromkeys(value))
 
 
 class GenerateResponse(BaseModel):
     generation_id: str
+    queue_position: int = 0
+    # Tier the job actually renders at
+    tier: str = "standard"
+    # Predicted seconds until the image is ready (None until stats exist)
+    estimated_seconds: float | None = None
+
+
+class CancelResponse(BaseModel):
+    generation_id: str
+    # "cancelled", a terminal status it already had, or "detached" when
+    # other requesters share the render and it keeps running for them
+    status: str
 
 
+# Payload of /status events, as built by routers.status.build_status_event
 class StatusEvent(BaseModel):
     status: str
     progress: float
     step: int | None = None
     total_steps: int | None = None
+    queue_position: int | None = None
     image_url: str | None = None
+    image_urls: list[str] | None = None
+    # Set a little after completion, once derivatives have been generated
+    thumbnail_url: str | None = None
+    thumbnail_urls: list[str] | None = None
+    # Newest sampler preview while generating; changes with every frame
+    preview_url: str | None = None
+    tier: str | None = None
+    estimated_seconds: float | None = None
     message: str | None = None
 
 
@@ -1,6 +1,9 @@
-from fastapi import APIRouter
-from app.models.schemas import GachaSpinResponse
-from app.services.gacha_logic import spin_gacha
+import random
+from fastapi import APIRouter, HTTPException
+from app.models.schemas import GachaSpinResponse, GachaBulkRequest, GachaBulkResponse
+from app.services.gacha_logic import spin_gacha, spin_gacha_bulk, get_session, SeedMismatchError
+from app.services.broker import broker
+from app.services.hub import call_hub, hub_service
 
 router = APIRouter()
 
@@ -8,3 +11,36 @@ router = APIRouter()
 @router.post("/gacha/spin", response_model=GachaSpinResponse)
 async def gacha_spin():
     return spin_gacha()
+
+
+async def draw_from_session(payload: dict) -> dict:
+    """Continue a seeded session; sessions live on the hub worker only."""
+    request = GachaBulkRequest(**payload)
+    try:
+        session = get_session(request.session_id, request.seed)
+    except SeedMismatchError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    first_draw = session.draws
+    results = spin_gacha_bulk(request.count, session.rng)
+    session.draws += request.count
+    return GachaBulkResponse(
+        results=results,
+        session_id=request.session_id,
+        seed=session.seed,
+        first_draw=first_draw,
+    ).model_dump()
+
+
+broker.serve("gacha_session", hub_service(draw_from_session))
+
+
+@router.post("/gacha/spin/bulk", response_model=GachaBulkResponse)
+async def gacha_spin_bulk(request: GachaBulkRequest):
+    if request.session_id is not None:
+        return GachaBulkResponse(**await call_hub("gacha_session", request.model_dump()))
+
+    if request.seed is not None:
+        results = spin_gacha_bulk(request.count, random.Random(request.seed))
+        return GachaBulkResponse(results=results, seed=request.seed)
+
+    return GachaBulkResponse(results=spin_gacha_bulk(request.count))
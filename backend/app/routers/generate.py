@@ -1,64 +1,411 @@
+import time
 import uuid
+import asyncio
 import logging
-from fastapi import APIRouter, BackgroundTasks, HTTPException
-from app.models.schemas import GenerateRequest, GenerateResponse
-from app.services.prompt_builder import build_workflow
+from fastapi import APIRouter, HTTPException, Request
+from app.models.schemas import GenerateRequest, GenerateResponse, CancelResponse
+from app.services.prompt_builder import build_workflow, workflow_affinity
 from app.services.comfyui_client import comfyui_client
+from app.services.status_bus import status_bus
+from app.services.job_store import job_store, TERMINAL_STATUSES
+from app.services.broker import broker
+from app.services.hub import call_hub, hub_service
+from app.services.render_cache import render_cache
+from app.services.scheduler import scheduler, QueueFullError
+from app.services.image_store import store_image, image_url, thumbnail_url
+from app.services.postprocess import postprocessor
+from app.services.render_tiers import choose_tier
+from app.services.wait_estimator import wait_estimator
+from app.services.metrics import (
+    Timeline,
+    cancellations_total,
+    generations_total,
+    gpu_seconds_reclaimed_total,
+    tier_downgrades_total,
+)
+from app.services.preview_store import preview_store
+from app.config import settings
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
-# In-memory store for generation tracking
-# In production, use Redis or a database
-generation_store: dict[str, dict] = {}
 
+def update_generation(generation_id: str, **fields):
+    """Apply a state change and wake status subscribers in every worker."""
+    # The owner re-estimates on every change; other workers only mirror it
+    current = job_store.get(generation_id) or {}
+    fields["estimated_seconds"] = wait_estimator.estimate({**current, **fields})
+    job_store.update(generation_id, **fields)
+    status_bus.publish(generation_id)
+    broker.publish(generation_id, job_store.get(generation_id))
 
-async def run_generation(generation_id: str, workflow: dict):
+
+def apply_remote_update(generation_id: str, snapshot: dict):
+    """A job owned by another worker changed; mirror it and wake local streams."""
+    job_store.replace(generation_id, snapshot)
+    if snapshot.get("status") in TERMINAL_STATUSES:
+        preview_store.discard(generation_id)
+    status_bus.publish(generation_id)
+
+
+def register_derivatives(generation_id: str, count: int):
+    urls = [thumbnail_url(generation_id, index) for index in range(count)]
+    update_generation(generation_id, thumbnail_url=urls[0], thumbnail_urls=urls)
+
+
+broker.subscribe(apply_remote_update)
+postprocessor.on_complete(register_derivatives)
+scheduler.route_with(comfyui_client.next_node)
+
+# Strong references to fire-and-forget tasks until they finish
+_background_tasks: set[asyncio.Task] = set()
+
+
+def _spawn(coro):
+    task = asyncio.create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+
+async def publish_preview(generation_id: str, media_type: str, data: bytes):
+    frame = await preview_store.add(generation_id, media_type, data)
+    if frame is None:
+        return
+    # Only the sequence number is published; other workers fetch the frame on request
+    update_generation(generation_id, preview=frame.seq)
+
+
+def preview_handler(generation_id: str):
+    def on_preview(media_type: str, data: bytes):
+        # Rate limiting happens here, before the frame is decoded at all
+        if settings.preview_enabled and preview_store.offer(generation_id):
+            _spawn(publish_preview(generation_id, media_type, data))
+
+    return on_preview
+
+
+async def run_generation(
+    generation_id: str,
+    workflow: dict,
+    cache_key: str | None = None,
+    timeline: Timeline | None = None,
+):
     """Background task that submits workflow to ComfyUI and tracks progress."""
-    client_id = generation_id
+    timeline = timeline or Timeline()
+    timeline.mark("dispatched")
+    submission = None
     try:
-        generation_store[generation_id]["status"] = "queued"
-        prompt_id = await comfyui_client.queue_prompt(workflow, client_id)
-        generation_store[generation_id]["prompt_id"] = prompt_id
-        generation_store[generation_id]["status"] = "generating"
-
-        async for event in comfyui_client.track_progress(prompt_id, client_id):
-            generation_store[generation_id].update(event)
-            if event["status"] in ("complete", "error"):
+        update_generation(generation_id, queue_position=0)
+        completed = False
+        # A prompt interrupted by someone else (a cancel of another job racing
+        # its completion, ComfyUI's own UI) is resubmitted once
+        for attempt in range(2):
+            # Shielded so a cancellation arriving mid-submit still learns the prompt_id
+            submission = asyncio.ensure_future(comfyui_client.queue_prompt(workflow))
+            prompt_id = await asyncio.shield(submission)
+            timeline.mark("comfyui_queued")
+            scheduler.record_affinity(comfyui_client.node_for(prompt_id).base_url, workflow_affinity(workflow))
+            update_generation(generation_id, prompt_id=prompt_id, status="generating")
+
+            interrupted = None
+            last_tick = None  # (step, monotonic time) of the previous progress event
+            async for event in comfyui_client.track_progress(
+                prompt_id, timeline, preview_handler(generation_id)
+            ):
+                step = event.get("step")
+                if step:
+                    now = time.monotonic()
+                    if last_tick is not None and step > last_tick[0]:
+                        wait_estimator.observe_steps(step - last_tick[0], now - last_tick[1])
+                    last_tick = (step, now)
+                if event["status"] == "complete":
+                    # Hold back completion until the image is persisted below
+                    event = {**event, "status": "generating"}
+                    job_store.update(generation_id, **event)
+                    completed = True
+                    break
+                if event["status"] == "interrupted":
+                    interrupted = event
+                    break
+                update_generation(generation_id, **event)
+                if event["status"] == "error":
+                    break
+
+            if interrupted is None:
                 break
+            if attempt == 0:
+                logger.warning("Prompt %s of %s was interrupted, resubmitting", prompt_id, generation_id)
+                update_generation(generation_id, progress=0, step=None)
+            else:
+                update_generation(generation_id, status="error", message=interrupted["message"])
+
+        # If complete, fetch and save every variant in the batch
+        if completed:
+            urls = []
+            for index, image in enumerate(job_store.get(generation_id).get("images", [])):
+                await store_image(generation_id, index, image, prompt_id)
+                urls.append(image_url(generation_id, index))
+            timeline.mark("image_fetched")
+            # ComfyUI's filenames and the preview are not needed once the images are stored
+            preview_store.discard(generation_id)
+            job_store.update(generation_id, images=None, preview=None)
+            if urls:
+                job_store.update(generation_id, image_url=urls[0], image_urls=urls)
+            update_generation(generation_id, status="complete", progress=1.0)
+            timeline.mark("persisted")
+            wait_estimator.observe_job(timeline)
+            if urls:
+                postprocessor.submit(generation_id, len(urls))
 
-        # If complete, fetch and save image
-        if generation_store[generation_id].get("status") == "complete":
-            filename = generation_store[generation_id].get("image_filename")
-            subfolder = generation_store[generation_id].get("subfolder", "")
-            if filename:
-                image_data = await comfyui_client.get_image(filename, subfolder)
-                from app.config import settings
-                from pathlib import Path
-
-                output_dir = Path(settings.image_output_dir)
-                output_dir.mkdir(parents=True, exist_ok=True)
-                image_path = output_dir / f"{generation_id}.png"
-                image_path.write_bytes(image_data)
-                generation_store[generation_id]["image_url"] = f"/api/images/{generation_id}"
-                logger.info("Image saved: %s", image_path)
+    except asyncio.CancelledError:
+        await withdraw_prompt(generation_id, submission, timeline)
+        update_generation(
+            generation_id,
+            status="cancelled",
+            queue_position=None,
+            message=_cancel_reasons.pop(generation_id, "Cancelled"),
+        )
+        raise
 
     except Exception as e:
         logger.error("Generation %s failed: %s", generation_id, e)
-        generation_store[generation_id]["status"] = "error"
-        generation_store[generation_id]["message"] = str(e)
+        update_generation(generation_id, status="error", message=str(e))
 
+    finally:
+        _requesters.pop(generation_id, None)
+        _remote_watchers.pop(generation_id, None)
+        preview_store.discard(generation_id)
+        timeline.observe(job_store.get(generation_id).get("status", "error"))
+
+        if cache_key is not None:
+            if job_store.get(generation_id).get("image_url"):
+                render_cache.complete(cache_key, generation_id)
+            else:
+                render_cache.discard(cache_key, generation_id)
+
+
+# Message recorded on a job whose task is being cancelled
+_cancel_reasons: dict[str, str] = {}
+
+# Requests coalesced onto a running generation by the render cache, beyond
+# the one that started it; a cancel only stops the render for the last one
+_requesters: dict[str, int] = {}
+
+
+def detach_requester(generation_id: str) -> bool:
+    """Drop one of several requesters sharing a render; False if it was the last."""
+    count = _requesters.get(generation_id, 1)
+    if count <= 1:
+        return False
+    _requesters[generation_id] = count - 1
+    return True
+
+
+def remaining_render_seconds(generation_id: str, timeline: Timeline) -> float:
+    """Estimate how much ComfyUI time a job still needed when it was stopped."""
+    data = job_store.get(generation_id) or {}
+    step, total = data.get("step"), data.get("total_steps")
+    first_step = timeline.marks.get("first_step")
+    if step and total and step > 1 and first_step is not None:
+        per_step = (time.monotonic() - first_step) / (step - 1)
+        return max(0.0, (total - step) * per_step)
+    return scheduler.avg_job_seconds
+
+
+async def withdraw_prompt(generation_id: str, submission: asyncio.Future | None, timeline: Timeline):
+    """Stop a cancelled job's prompt in ComfyUI and account for the time saved."""
+    stage = "queued"
+    try:
+        prompt_id = await submission if submission is not None else None
+    except Exception:
+        prompt_id = None
+    if prompt_id is not None:
+        try:
+            stage = await comfyui_client.withdraw(prompt_id) or "finished"
+        except Exception as e:
+            logger.warning("Could not cancel prompt %s in ComfyUI: %s", prompt_id, e)
+            stage = "unreachable"
+    if stage in ("queued", "pending", "executing"):
+        gpu_seconds_reclaimed_total.inc(remaining_render_seconds(generation_id, timeline))
+    cancellations_total.inc(1, stage)
+
+
+async def cancel_generation(generation_id: str, reason: str) -> str | None:
+    """Cancel a job this worker owns; returns the state it was cancelled in."""
+    task = scheduler.task(generation_id)
+    if task is not None:
+        _cancel_reasons[generation_id] = reason
+    state = scheduler.cancel(generation_id)
+    if state == "queued":
+        # Never reached ComfyUI: the whole render is saved
+        update_generation(generation_id, status="cancelled", queue_position=None, message=reason)
+        cancellations_total.inc(1, "queued")
+        gpu_seconds_reclaimed_total.inc(scheduler.avg_job_seconds)
+        generations_total.inc(1, "cancelled")
+    elif task is not None:
+        # Let run_generation withdraw the prompt and record the outcome
+        await asyncio.wait({task}, timeout=settings.comfyui_read_timeout)
+    _cancel_reasons.pop(generation_id, None)
+    _requesters.pop(generation_id, None)
+    logger.info("Generation %s cancelled (%s): %s", generation_id, state, reason)
+    return state
+
+
+# Other workers currently streaming a generation's status, as reported to the hub
+_remote_watchers: dict[str, int] = {}
+
+
+def watched(generation_id: str) -> bool:
+    return status_bus.subscriber_count(generation_id) > 0 or _remote_watchers.get(generation_id, 0) > 0
+
+
+def schedule_auto_cancel(generation_id: str):
+    """Cancel a job nobody streams any more, in any worker, unless someone returns in time."""
+    if settings.auto_cancel_grace <= 0 or not scheduler.owns(generation_id) or watched(generation_id):
+        return
+
+    def check():
+        if not watched(generation_id) and scheduler.owns(generation_id):
+            _spawn(cancel_generation(generation_id, "Abandoned: no status subscribers"))
+
+    asyncio.get_running_loop().call_later(settings.auto_cancel_grace, check)
+
+
+async def watch_changed(payload: dict) -> dict:
+    """A non-hub worker started or stopped streaming a generation."""
+    generation_id = payload["generation_id"]
+    count = _remote_watchers.get(generation_id, 0) + payload["delta"]
+    if count > 0:
+        _remote_watchers[generation_id] = count
+    else:
+        _remote_watchers.pop(generation_id, None)
+        schedule_auto_cancel(generation_id)
+    return {}
+
+
+def report_active(generation_id: str):
+    if broker.role == "peer":
+        broker.notify("watch", {"generation_id": generation_id, "delta": 1})
+
+
+def report_idle(generation_id: str):
+    if broker.role == "peer":
+        broker.notify("watch", {"generation_id": generation_id, "delta": -1})
+    else:
+        schedule_auto_cancel(generation_id)
+
+
+broker.serve("watch", watch_changed)
+status_bus.on_active(report_active)
+status_bus.on_idle(report_idle)
+
+
+def client_key(http_request: Request) -> str:
+    """Identify the caller for fair queuing; a trusted proxy (nginx) forwards the real address."""
+    peer = http_request.client.host if http_request.client else None
+    real_ip = http_request.headers.get("x-real-ip")
+    if real_ip and peer and settings.is_trusted_proxy(peer):
+        return real_ip
+    return peer or "unknown"
+
+
+async def submit_generation(payload: dict) -> dict:
+    """Admit a generation into this (the hub) worker's scheduler."""
+    request = GenerateRequest(**payload["request"])
+    if not comfyui_client.available:
+        # Fail fast instead of queueing work that cannot reach ComfyUI
+        raise HTTPException(status_code=503, detail="ComfyUI is unavailable")
+    if not comfyui_client.ready:
+        # Models still loading; a render now would pay for the warm-up itself
+        raise HTTPException(
+            status_code=503,
+            detail="ComfyUI is warming up",
+            headers={"Retry-After": str(max(1, round(settings.comfyui_health_interval)))},
+        )
+
+    tier = choose_tier(request.tier, scheduler.depth, scheduler.estimated_wait())
+    if tier != request.tier:
+        tier_downgrades_total.inc(1, request.tier, tier)
+    workflow = build_workflow(request, tier)
+
+    cache_key = None
+    if request.cache and settings.render_cache_enabled:
+        cache_key = render_cache.key_for(workflow, include_seed=request.seed is not None)
+        cached_id = render_cache.lookup(cache_key)
+        cached = job_store.get(cached_id) if cached_id is not None else None
+        if cached is not None and cached["status"] not in ("error", "cancelled"):
+            if cached["status"] not in TERMINAL_STATUSES:
+                _requesters[cached_id] = _requesters.get(cached_id, 1) + 1
+            # Finished: the status stream completes at once. Running: attach to it.
+            return GenerateResponse(
+                generation_id=cached_id,
+                queue_position=scheduler.position(cached_id),
+                tier=cached.get("tier") or tier,
+                estimated_seconds=cached.get("estimated_seconds"),
+            ).model_dump()
 
-@router.post("/generate", response_model=GenerateResponse)
-async def generate(request: GenerateRequest, background_tasks: BackgroundTasks):
     generation_id = str(uuid.uuid4())
-    workflow = build_workflow(request)
+    job_store.create(generation_id, status="queued", progress=0, tier=tier)
+    timeline = Timeline(submitted=time.monotonic())
+
+    try:
+        position = scheduler.submit(
+            generation_id,
+            payload["client_key"],
+            lambda: run_generation(generation_id, workflow, cache_key, timeline),
+            on_position=lambda p: update_generation(generation_id, queue_position=p),
+            affinity=workflow_affinity(workflow),
+        )
+    except QueueFullError as e:
+        job_store.delete(generation_id)
+        raise HTTPException(
+            status_code=429,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)},
+        )
 
-    generation_store[generation_id] = {
-        "status": "queued",
-        "progress": 0,
-    }
+    update_generation(generation_id, queue_position=position)
+    if cache_key is not None:
+        render_cache.add(cache_key, generation_id)
+
+    return GenerateResponse(
+        generation_id=generation_id,
+        queue_position=position,
+        tier=tier,
+        estimated_seconds=job_store.get(generation_id).get("estimated_seconds"),
+    ).model_dump()
+
+
+async def cancel_requested(payload: dict) -> dict:
+    generation_id = payload["generation_id"]
+    data = job_store.get(generation_id)
+    if data is None:
+        raise HTTPException(status_code=404, detail="Generation not found")
+    status = data["status"]
+    if status not in TERMINAL_STATUSES and scheduler.owns(generation_id):
+        if detach_requester(generation_id):
+            # Others still wait for this render; only this caller leaves it
+            status = "detached"
+        else:
+            await cancel_generation(generation_id, "Cancelled by user")
+            status = job_store.get(generation_id)["status"]
+    return CancelResponse(generation_id=generation_id, status=status).model_dump()
+
+
+broker.serve("generate", hub_service(submit_generation))
+broker.serve("cancel", hub_service(cancel_requested))
+
+
+@router.post("/generate", response_model=GenerateResponse)
+async def generate(request: GenerateRequest, http_request: Request):
+    # Validated here; admitted by the hub, which runs the only scheduler
+    result = await call_hub(
+        "generate",
+        {"request": request.model_dump(), "client_key": client_key(http_request)},
+    )
+    return GenerateResponse(**result)
 
-    background_tasks.add_task(run_generation, generation_id, workflow)
 
-    return GenerateResponse(generation_id=generation_id)
+@router.post("/generate/{generation_id}/cancel", response_model=CancelResponse)
+async def cancel(generation_id: str):
+    return CancelResponse(**await call_hub("cancel", {"generation_id": generation_id}))
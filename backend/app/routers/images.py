@@ -1,14 +1,173 @@
+import base64
+import asyncio
+import hashlib
+from collections import OrderedDict
 from pathlib import Path
-from fastapi import APIRouter, HTTPException
-from fastapi.responses import FileResponse
-from app.config import settings
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import FileResponse, Response
+from app.services.image_store import image_path, thumbnail_path
+from app.services.preview_store import preview_store, PreviewFrame
+from app.services.broker import broker
+from app.services.hub import call_hub, hub_service
 
 router = APIRouter()
 
+# Generated images never change once written, so clients may cache them forever
+CACHE_CONTROL = "public, max-age=31536000, immutable"
 
-@router.get("/images/{generation_id}")
-async def get_image(generation_id: str):
-    image_path = Path(settings.image_output_dir) / f"{generation_id}.png"
-    if not image_path.exists():
+# Pre-encoded siblings (keyring.avif next to keyring.png), best first
+ENCODED_VARIANTS = [
+    ("image/avif", ".avif"),
+    ("image/webp", ".webp"),
+]
+
+# Content hashes keyed by path and invalidated by (mtime, size)
+_ETAG_CACHE_SIZE = 4096
+_etags: OrderedDict[Path, tuple[int, int, str]] = OrderedDict()
+
+
+def _hash_file(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(256 * 1024), b""):
+            digest.update(chunk)
+    return f'"{digest.hexdigest()[:32]}"'
+
+
+async def content_etag(path: Path) -> str:
+    """Strong ETag derived from the file's bytes, hashed once per file."""
+    st = await asyncio.to_thread(path.stat)
+    cached = _etags.get(path)
+    if cached is not None and cached[:2] == (st.st_mtime_ns, st.st_size):
+        _etags.move_to_end(path)
+        return cached[2]
+    etag = await asyncio.to_thread(_hash_file, path)
+    _etags[path] = (st.st_mtime_ns, st.st_size, etag)
+    if len(_etags) > _ETAG_CACHE_SIZE:
+        _etags.popitem(last=False)
+    return etag
+
+
+def parse_accept(accept: str) -> dict[str, float]:
+    """Media ranges of an Accept header mapped to their q-values."""
+    ranges = {}
+    for item in accept.split(","):
+        media_range, *params = (part.strip() for part in item.split(";"))
+        if not media_range:
+            continue
+        q = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = min(max(float(value), 0.0), 1.0)
+                except ValueError:
+                    q = 0.0
+        ranges[media_range.lower()] = q
+    return ranges
+
+
+def accept_quality(ranges: dict[str, float], media_type: str) -> float:
+    """q-value of a media type under the most specific range that matches it."""
+    for key in (media_type, media_type.split("/")[0] + "/*", "*/*"):
+        if key in ranges:
+            return ranges[key]
+    return 0.0
+
+
+def negotiate(path: Path, accept: str) -> tuple[Path, str]:
+    """Pick the representation the client prefers, smallest first on ties.
+
+    An encoded variant must be named explicitly: wildcards only admit it
+    when the client refuses PNG, since ``*/*`` and ``image/*`` are also
+    sent by clients that cannot decode AVIF or WebP. The PNG is served when
+    nothing is acceptable.
+    """
+    ranges = parse_accept(accept)
+    png_quality = accept_quality(ranges, "image/png")
+    best, best_quality = (path, "image/png"), png_quality
+    for media_type, suffix in ENCODED_VARIANTS:
+        if media_type in ranges:
+            quality = ranges[media_type]
+        else:
+            quality = accept_quality(ranges, media_type) if png_quality == 0 else 0.0
+        # Ties go to the smaller representation: earlier variants, then PNG last
+        beats = quality > best_quality or (quality == best_quality and best[1] == "image/png")
+        if quality > 0 and beats:
+            candidate = path.with_suffix(suffix)
+            if candidate.is_file():
+                best, best_quality = (candidate, media_type), quality
+    return best
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    if if_none_match.strip() == "*":
+        return True
+    return etag in (tag.strip() for tag in if_none_match.split(","))
+
+
+@router.api_route("/images/{generation_id}", methods=["GET", "HEAD"])
+@router.api_route("/images/{generation_id}/{index}", methods=["GET", "HEAD"])
+async def get_image(request: Request, generation_id: str, index: int = 0):
+    path = image_path(generation_id, index)
+    if not path.exists():
         raise HTTPException(status_code=404, detail="Image not found")
-    return FileResponse(image_path, media_type="image/png")
+
+    path, media_type = negotiate(path, request.headers.get("accept", ""))
+    etag = await content_etag(path)
+    headers = {
+        "ETag": etag,
+        "Cache-Control": CACHE_CONTROL,
+        "Vary": "Accept",
+    }
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+
+    # FileResponse handles Range / If-Range against the ETag set here
+    return FileResponse(path, media_type=media_type, headers=headers)
+
+
+@router.get("/thumbnails/{generation_id}")
+@router.get("/thumbnails/{generation_id}/{index}")
+async def get_thumbnail(request: Request, generation_id: str, index: int = 0):
+    path = thumbnail_path(generation_id, index)
+    if not path.exists():
+        raise HTTPException(status_code=404, detail="Thumbnail not found")
+
+    etag = await content_etag(path)
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    return FileResponse(path, media_type="image/jpeg", headers=headers)
+
+
+async def read_preview(payload: dict) -> dict:
+    """A preview frame held by the hub, whose scheduler runs every render."""
+    frame = preview_store.get(payload["generation_id"])
+    if frame is None:
+        raise HTTPException(status_code=404, detail="No preview available")
+    return {"seq": frame.seq, "media_type": frame.media_type, "data": base64.b64encode(frame.data).decode()}
+
+
+broker.serve("preview", hub_service(read_preview))
+
+
+@router.get("/preview/{generation_id}")
+async def get_preview(generation_id: str, v: int = 0):
+    """Newest sampler preview of a running generation (see preview_url in status).
+
+    ``v`` is the frame's sequence number from the status event. Workers
+    other than the hub fetch frames from it when asked for a newer one
+    than they hold, so frames only cross the broker when someone views them.
+    """
+    frame = preview_store.get(generation_id)
+    if (frame is None or frame.seq < v) and broker.enabled and broker.role != "hub":
+        result = await call_hub("preview", {"generation_id": generation_id})
+        frame = PreviewFrame(result["seq"], result["media_type"], base64.b64decode(result["data"]))
+        preview_store.put(generation_id, frame)
+    if frame is None:
+        raise HTTPException(status_code=404, detail="No preview available")
+    return Response(frame.data, media_type=frame.media_type, headers={"Cache-Control": "no-store"})
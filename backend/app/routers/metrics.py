@@ -0,0 +1,36 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from app.services.comfyui_client import comfyui_client
+from app.services.metrics import metrics
+from app.services.scheduler import scheduler
+from app.services.wait_estimator import wait_estimator
+from app.services.postprocess import postprocessor
+
+router = APIRouter()
+
+metrics.gauge("keyring_jobs_in_flight", "Generations running on ComfyUI", lambda: scheduler.in_flight)
+metrics.gauge("keyring_jobs_queued", "Generations waiting in the scheduler", lambda: scheduler.depth)
+metrics.gauge(
+    "keyring_comfyui_nodes_available",
+    "ComfyUI nodes accepting work",
+    lambda: sum(node.accepting for node in comfyui_client.nodes),
+)
+metrics.gauge("keyring_comfyui_queue_depth", "Prompts running or pending in ComfyUI", lambda: comfyui_client.queue_depth)
+metrics.gauge("keyring_postprocess_queued", "Images waiting for post-processing", lambda: postprocessor.depth)
+# Inputs of the wait-time estimate shown to users
+metrics.gauge(
+    "keyring_estimated_step_seconds",
+    "Rolling average time per sampler step",
+    lambda: wait_estimator.step_seconds or 0,
+)
+metrics.gauge(
+    "keyring_estimated_overhead_seconds",
+    "Rolling average time per job outside sampling and ComfyUI's queue",
+    lambda: wait_estimator.pre_seconds + wait_estimator.post_seconds,
+)
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
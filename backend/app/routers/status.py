@@ -1,48 +1,107 @@
 import json
+import time
 import asyncio
-from fastapi import APIRouter
+import logging
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect
 from starlette.responses import StreamingResponse
+from app.config import settings
+from app.services.status_bus import status_bus
+from app.services.job_store import job_store, TERMINAL_STATUSES
+from app.services.metrics import active_status_streams, active_status_sockets
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
+
+
+def build_status_event(generation_id: str, data: dict) -> dict:
+    event = {
+        "status": data.get("status", "queued"),
+        "progress": data.get("progress", 0),
+    }
+    if data.get("step") is not None:
+        event["step"] = data["step"]
+    if data.get("total_steps") is not None:
+        event["total_steps"] = data["total_steps"]
+    if data.get("queue_position"):
+        event["queue_position"] = data["queue_position"]
+    if data.get("image_url"):
+        event["image_url"] = data["image_url"]
+    if data.get("image_urls"):
+        event["image_urls"] = data["image_urls"]
+    if data.get("thumbnail_urls"):
+        event["thumbnail_url"] = data["thumbnail_url"]
+        event["thumbnail_urls"] = data["thumbnail_urls"]
+    if data.get("preview") and event["status"] == "generating":
+        # Changes with every new frame, so clients know when to refetch
+        event["preview_url"] = f"/api/preview/{generation_id}?v={data['preview']}"
+    if data.get("tier"):
+        event["tier"] = data["tier"]
+    if data.get("estimated_seconds") is not None:
+        event["estimated_seconds"] = data["estimated_seconds"]
+    if data.get("message"):
+        event["message"] = data["message"]
+    return event
+
+
+NOT_FOUND_EVENT = {"status": "error", "progress": 0, "message": "Not found"}
+
+# Changes limited to these fields are rate-limited on the status WebSocket
+PROGRESS_FIELDS = {"progress", "step", "total_steps", "preview_url", "estimated_seconds"}
+
+
+def event_delta(old: dict, new: dict) -> dict:
+    """Fields of new that differ from old; fields that disappeared map to None."""
+    delta = {key: value for key, value in new.items() if old.get(key) != value}
+    for key in old.keys() - new.keys():
+        delta[key] = None
+    return delta
 
 
 @router.get("/status/{generation_id}")
 async def generation_status(generation_id: str):
     async def event_stream():
-        from app.routers.generate import generation_store
-
-        last_progress = -1
-        while True:
-            data = generation_store.get(generation_id)
-            if data is None:
-                yield f"data: {json.dumps({'status': 'error', 'progress': 0, 'message': 'Not found'})}\n\n"
-                return
-
-            current_progress = data.get("progress", 0)
-            status = data.get("status", "queued")
-
-            # Only send update if progress changed or status is terminal
-            if current_progress != last_progress or status in ("complete", "error"):
-                event = {
-                    "status": status,
-                    "progress": current_progress,
-                }
-                if data.get("step") is not None:
-                    event["step"] = data["step"]
-                if data.get("total_steps") is not None:
-                    event["total_steps"] = data["total_steps"]
-                if data.get("image_url"):
-                    event["image_url"] = data["image_url"]
-                if data.get("message"):
-                    event["message"] = data["message"]
-
-                yield f"data: {json.dumps(event)}\n\n"
-                last_progress = current_progress
-
-                if status in ("complete", "error"):
+        waiter = status_bus.subscribe(generation_id)
+        active_status_streams.inc()
+        try:
+            last_event = None
+            grace = settings.status_not_found_grace
+            while True:
+                data = job_store.get(generation_id)
+                if data is None and grace > 0:
+                    # The job may have been accepted by another worker whose
+                    # snapshot has not reached this one yet
+                    try:
+                        await asyncio.wait_for(waiter.wait(), timeout=grace)
+                    except asyncio.TimeoutError:
+                        pass
+                    waiter.clear()
+                    grace = 0
+                    continue
+                if data is None:
+                    yield f"data: {json.dumps(NOT_FOUND_EVENT)}\n\n"
                     return
 
-            await asyncio.sleep(0.5)
+                # Only send update if something the client sees changed
+                event = build_status_event(generation_id, data)
+                if event != last_event:
+                    yield f"data: {json.dumps(event)}\n\n"
+                    last_event = event
+
+                    if event["status"] in TERMINAL_STATUSES:
+                        return
+
+                # Sleep until run_generation publishes a change
+                try:
+                    await asyncio.wait_for(
+                        waiter.wait(), timeout=settings.status_heartbeat_interval
+                    )
+                except asyncio.TimeoutError:
+                    yield ": heartbeat\n\n"
+                    continue
+                waiter.clear()
+        finally:
+            active_status_streams.dec()
+            status_bus.unsubscribe(generation_id, waiter)
 
     return StreamingResponse(
         event_stream(),
@@ -52,3 +111,133 @@ async def generation_status(generation_id: str):
             "X-Accel-Buffering": "no",
         },
     )
+
+
+class StatusSocket:
+    """One WebSocket tracking any number of generations.
+
+    The client sends ``{"action": "subscribe" | "unsubscribe", "ids": [...]}``.
+    The server sends ``{"updates": {id: fields}}``: the full status event the
+    first time an id is reported, afterwards only the fields that changed
+    (null for removed ones). Updates that only move progress are sent at most
+    once per ``status_ws_progress_interval`` per generation. Ids are dropped
+    once their terminal event has been sent.
+    """
+
+    def __init__(self, websocket: WebSocket):
+        self.websocket = websocket
+        # One waiter shared by every subscription on this connection
+        self.waiter = asyncio.Event()
+        self.sent: dict[str, dict] = {}
+        self.missing_since: dict[str, float] = {}
+        self.progress_due: dict[str, float] = {}
+        self.deferred: set[str] = set()
+
+    def subscribe(self, ids: list[str]) -> bool:
+        for generation_id in ids:
+            if generation_id in self.sent:
+                continue
+            if len(self.sent) >= settings.status_ws_max_subscriptions:
+                return False
+            status_bus.subscribe(generation_id, self.waiter)
+            self.sent[generation_id] = {}
+        self.waiter.set()
+        return True
+
+    def unsubscribe(self, generation_id: str):
+        if self.sent.pop(generation_id, None) is not None:
+            status_bus.unsubscribe(generation_id, self.waiter)
+        self.missing_since.pop(generation_id, None)
+        self.progress_due.pop(generation_id, None)
+        self.deferred.discard(generation_id)
+
+    def close(self):
+        for generation_id in list(self.sent):
+            self.unsubscribe(generation_id)
+
+    async def receive(self):
+        while True:
+            try:
+                message = json.loads(await self.websocket.receive_text())
+            except ValueError:
+                message = None
+            ids = message.get("ids") if isinstance(message, dict) else None
+            if not isinstance(ids, list) or not all(isinstance(i, str) for i in ids):
+                await self.websocket.send_json({"error": "expected {action, ids: [...]}"})
+                continue
+            if message.get("action") == "subscribe":
+                if not self.subscribe(ids):
+                    await self.websocket.send_json({
+                        "error": f"at most {settings.status_ws_max_subscriptions} subscriptions"
+                    })
+            elif message.get("action") == "unsubscribe":
+                for generation_id in ids:
+                    self.unsubscribe(generation_id)
+            else:
+                await self.websocket.send_json({"error": "unknown action"})
+
+    def collect(self, now: float) -> dict:
+        updates = {}
+        for generation_id, last in list(self.sent.items()):
+            data = job_store.get(generation_id)
+            if data is None:
+                since = self.missing_since.setdefault(generation_id, now)
+                if now - since < settings.status_not_found_grace:
+                    continue
+                event = NOT_FOUND_EVENT
+            else:
+                self.missing_since.pop(generation_id, None)
+                event = build_status_event(generation_id, data)
+
+            delta = event_delta(last, event)
+            if not delta:
+                continue
+            if last and delta.keys() <= PROGRESS_FIELDS and now < self.progress_due.get(generation_id, 0):
+                self.deferred.add(generation_id)
+                continue
+
+            updates[generation_id] = delta if last else event
+            if event["status"] in TERMINAL_STATUSES:
+                self.unsubscribe(generation_id)
+            else:
+                self.sent[generation_id] = event
+                self.progress_due[generation_id] = now + settings.status_ws_progress_interval
+                self.deferred.discard(generation_id)
+        return updates
+
+    def next_deadline(self) -> float | None:
+        deadlines = [self.progress_due[i] for i in self.deferred]
+        deadlines += [since + settings.status_not_found_grace for since in self.missing_since.values()]
+        return min(deadlines, default=None)
+
+    async def send(self):
+        while True:
+            deadline = self.next_deadline()
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                await asyncio.wait_for(self.waiter.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+            self.waiter.clear()
+            updates = self.collect(time.monotonic())
+            if updates:
+                await self.websocket.send_json({"updates": updates})
+
+
+@router.websocket("/ws/status")
+async def status_socket(websocket: WebSocket):
+    await websocket.accept()
+    session = StatusSocket(websocket)
+    active_status_sockets.inc()
+    tasks = [asyncio.create_task(session.receive()), asyncio.create_task(session.send())]
+    try:
+        done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            error = task.exception()
+            if error is not None and not isinstance(error, WebSocketDisconnect):
+                logger.warning("Status socket closed: %s", error)
+    finally:
+        for task in tasks:
+            task.cancel()
+        session.close()
+        active_status_sockets.dec()
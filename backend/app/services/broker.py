@@ -0,0 +1,234 @@
+import os
+import json
+import fcntl
+import asyncio
+import logging
+from pathlib import Path
+from typing import Awaitable, Callable
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class BrokerUnavailableError(Exception):
+    """Raised when a call cannot reach the hub."""
+
+
+class EventBroker:
+    """Fans job snapshots out to every uvicorn worker on this host.
+
+    Workers elect a hub by taking an exclusive lock next to the socket path:
+    the lock holder listens on a Unix socket and relays each line it receives
+    to every other worker; the rest connect to it. If the hub exits, its lock
+    is released and the remaining workers elect a new one. Messages are one
+    JSON object per line: ``{"id": job_id, kind: payload}`` where kind is
+    "job" (a snapshot).
+
+    State that must be shared (the render scheduler, render cache, gacha
+    sessions) lives on the hub only: other workers reach it with ``call``,
+    sent as ``{"call": name, "ref": n, "payload": ...}`` and answered with
+    ``{"reply": n, "result": ...}`` on the same connection. With the broker
+    disabled (a single worker) calls run in-process.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.role = "idle"
+        self._handlers: dict[str, list[Callable[[str, dict], None]]] = {}
+        self._services: dict[str, Callable[[dict], Awaitable[dict]]] = {}
+        self._lock_file = None
+        self._peers: set[asyncio.StreamWriter] = set()
+        self._upstream: asyncio.StreamWriter | None = None
+        self._task: asyncio.Task | None = None
+        self._elected = asyncio.Event()
+        self._calls: dict[int, asyncio.Future] = {}
+        self._next_ref = 0
+
+    def subscribe(self, handler: Callable[[str, dict], None], kind: str = "job"):
+        """Register a callback for messages of one kind published by other workers."""
+        self._handlers.setdefault(kind, []).append(handler)
+
+    def serve(self, name: str, handler: Callable[[dict], Awaitable[dict]]):
+        """Register a hub-side service; it runs wherever ``call`` is answered."""
+        self._services[name] = handler
+
+    @property
+    def enabled(self) -> bool:
+        return self._task is not None
+
+    async def call(self, name: str, payload: dict, timeout: float = 30.0) -> dict:
+        """Run a service on the hub (in this process if it is the hub) and return its result."""
+        if not self.enabled:
+            return await self._services[name](payload)
+        try:
+            await asyncio.wait_for(self._elected.wait(), timeout)
+        except asyncio.TimeoutError:
+            raise BrokerUnavailableError("No event broker hub")
+        if self.role == "hub":
+            return await self._services[name](payload)
+        upstream = self._upstream
+        if upstream is None:
+            raise BrokerUnavailableError("Hub connection lost; electing a new hub")
+        self._next_ref += 1
+        ref = self._next_ref
+        future = self._calls[ref] = asyncio.get_running_loop().create_future()
+        try:
+            upstream.write((json.dumps({"call": name, "ref": ref, "payload": payload}) + "\n").encode())
+            return await asyncio.wait_for(future, timeout)
+        except (asyncio.TimeoutError, ConnectionError) as e:
+            raise BrokerUnavailableError(f"Hub did not answer {name}: {e}") from e
+        finally:
+            self._calls.pop(ref, None)
+
+    def notify(self, name: str, payload: dict):
+        """Like ``call`` without waiting for, or getting, a result."""
+        if not self.enabled or self.role == "hub":
+            if name in self._services:
+                asyncio.ensure_future(self._services[name](payload))
+        elif self._upstream is not None:
+            self._upstream.write((json.dumps({"call": name, "payload": payload}) + "\n").encode())
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for writer in list(self._peers):
+            writer.close()
+        self._peers.clear()
+        self._set_role("idle")
+
+    def _set_role(self, role: str):
+        self.role = role
+        if role == "idle":
+            self._elected.clear()
+        else:
+            self._elected.set()
+
+    def publish(self, job_id: str, snapshot: dict):
+        self._send({"id": job_id, "job": snapshot})
+
+    def _send(self, message: dict):
+        line = (json.dumps(message) + "\n").encode()
+        if self._upstream is not None:
+            self._upstream.write(line)
+        else:
+            self._broadcast(line)
+
+    async def _run(self):
+        while True:
+            try:
+                if self._try_lock():
+                    await self._serve()
+                else:
+                    await self._connect()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("Event broker %s: %s", self.role, e)
+            self._set_role("idle")
+            await asyncio.sleep(0.5)
+
+    def _try_lock(self) -> bool:
+        lock_file = open(f"{self.path}.lock", "a")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock_file.close()
+            return False
+        self._lock_file = lock_file
+        return True
+
+    async def _serve(self):
+        try:
+            # Holding the lock means any existing socket file is stale
+            Path(self.path).unlink(missing_ok=True)
+            server = await asyncio.start_unix_server(self._handle_peer, path=self.path)
+            self._set_role("hub")
+            logger.info("Event broker hub listening on %s (pid %d)", self.path, os.getpid())
+            async with server:
+                await server.serve_forever()
+        finally:
+            self._lock_file.close()
+            self._lock_file = None
+
+    async def _handle_peer(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self._peers.add(writer)
+        try:
+            async for line in reader:
+                message = self._parse(line)
+                if message is None:
+                    continue
+                if "call" in message:
+                    asyncio.ensure_future(self._answer(message, writer))
+                    continue
+                self._broadcast(line, exclude=writer)
+                self._deliver(message)
+        except ConnectionError:
+            pass
+        finally:
+            self._peers.discard(writer)
+            writer.close()
+
+    async def _connect(self):
+        reader, writer = await asyncio.open_unix_connection(self.path)
+        self._upstream = writer
+        self._set_role("peer")
+        logger.info("Event broker connected to hub %s (pid %d)", self.path, os.getpid())
+        try:
+            async for line in reader:
+                message = self._parse(line)
+                if message is None:
+                    continue
+                if "reply" in message:
+                    future = self._calls.get(message["reply"])
+                    if future is not None and not future.done():
+                        future.set_result(message["result"])
+                else:
+                    self._deliver(message)
+        finally:
+            # No longer elected: callers wait for the next hub instead of using a dead link
+            self._set_role("idle")
+            self._upstream = None
+            for future in self._calls.values():
+                if not future.done():
+                    future.set_exception(ConnectionError("hub connection lost"))
+            writer.close()
+
+    def _broadcast(self, line: bytes, exclude: asyncio.StreamWriter | None = None):
+        for writer in self._peers:
+            if writer is not exclude:
+                writer.write(line)
+
+    async def _answer(self, message: dict, writer: asyncio.StreamWriter):
+        try:
+            result = await self._services[message["call"]](message["payload"])
+        except Exception as e:
+            logger.error("Broker call %s failed: %s", message["call"], e)
+            result = {"error": {"status_code": 500, "detail": "Internal error"}}
+        if "ref" in message and not writer.is_closing():
+            writer.write((json.dumps({"reply": message["ref"], "result": result}) + "\n").encode())
+
+    @staticmethod
+    def _parse(line: bytes) -> dict | None:
+        try:
+            return json.loads(line)
+        except ValueError:
+            return None
+
+    def _deliver(self, message: dict):
+        job_id = message.pop("id")
+        for kind, payload in message.items():
+            for handler in self._handlers.get(kind, ()):
+                handler(job_id, payload)
+
+
+broker = EventBroker(settings.broker_socket)
@@ -0,0 +1,114 @@
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class BaseElement:
+    id: str
+    display_name: str
+    rarity: str
+    icon: str
+    weight: int
+    prompt: str
+
+
+@dataclass(frozen=True)
+class Potion:
+    id: str
+    name: str
+    color: str
+    icon: str
+    prompt: str
+
+
+@dataclass(frozen=True)
+class Option:
+    id: str
+    prompt: str
+
+
+@dataclass(frozen=True)
+class Color:
+    id: str
+    hex: str
+    name: str
+    prompt: str
+
+
+class Catalog:
+    """Every option a keyring can be made of, indexed by id.
+
+    The single source for gacha weights, prompt fragments and the choices
+    shown to clients. Each section is a dict in display order.
+    """
+
+    def __init__(
+        self,
+        base_elements: list[BaseElement],
+        potions: list[Potion],
+        shapes: list[Option],
+        patterns: list[Option],
+        colors: list[Color],
+    ):
+        self.base_elements = {e.id: e for e in base_elements}
+        self.potions = {p.id: p for p in potions}
+        self.shapes = {s.id: s for s in shapes}
+        self.patterns = {p.id: p for p in patterns}
+        self.colors = {c.id: c for c in colors}
+
+
+catalog = Catalog(
+    base_elements=[
+        BaseElement("crystal", "신비한 크리스탈", "rare", "💎", 10,
+                    "crystalline translucent keyring charm, gemstone, faceted, refractive light"),
+        BaseElement("wood", "나무 조각", "common", "🪵", 25,
+                    "wooden carved keyring charm, natural grain texture, rustic handcrafted"),
+        BaseElement("metal", "금속 파편", "common", "⚙️", 25,
+                    "polished metal keyring charm, chrome finish, reflective surface"),
+        BaseElement("plush", "봉제 인형", "uncommon", "🧸", 15,
+                    "soft plush keyring charm, fabric texture, cute stuffed toy style"),
+        BaseElement("glass", "유리 구슬", "uncommon", "🔮", 15,
+                    "blown glass keyring charm, delicate, iridescent, lampwork bead style"),
+        BaseElement("clay", "점토 덩어리", "common", "🏺", 20,
+                    "polymer clay keyring charm, handmade, smooth matte finish"),
+        BaseElement("resin", "레진 캡슐", "rare", "💧", 10,
+                    "epoxy resin keyring charm, clear with embedded elements, glossy dome"),
+        BaseElement("enchanted", "마법의 정수", "legendary", "✨", 5,
+                    "magical glowing keyring charm, ethereal, floating particles, fantasy artifact"),
+    ],
+    potions=[
+        Potion("potion_a", "별빛 정수", "#FFD700", "star-bottle", "sparkling, starry, cosmic dust"),
+        Potion("potion_b", "그림자 잉크", "#2D1B69", "dark-bottle", "dark elegant, noir, mysterious shadows"),
+        Potion("potion_c", "숲의 이슬", "#2ECC71", "leaf-bottle", "natural, botanical, leaf and vine motifs"),
+        Potion("potion_d", "바다의 눈물", "#3498DB", "water-bottle", "aquatic, water droplets, sea glass"),
+        Potion("potion_e", "불사조 재", "#E74C3C", "fire-bottle", "fiery, warm gradient, ember glow"),
+        Potion("potion_f", "서리꽃", "#85C1E9", "ice-bottle", "icy, snowflake patterns, frozen, winter"),
+        Potion("potion_g", "꿀 넥타르", "#F39C12", "honey-bottle", "golden warm, amber, honeycomb texture"),
+        Potion("potion_h", "꿈의 안개", "#D7BDE2", "dream-bottle", "pastel, dreamy, soft focus, cotton candy"),
+    ],
+    shapes=[
+        Option("circle", "circular round shape"),
+        Option("star", "five-pointed star shape"),
+        Option("heart", "heart shape"),
+        Option("hexagon", "hexagonal geometric shape"),
+        Option("cloud", "soft cloud shape, puffy edges"),
+        Option("diamond", "diamond rhombus shape, angular"),
+    ],
+    patterns=[
+        Option("swirl", "swirling spiral pattern"),
+        Option("dots", "polka dot pattern, scattered circles"),
+        Option("stripes", "striped pattern, parallel lines"),
+        Option("floral", "floral pattern, small flowers and petals"),
+        Option("geometric", "geometric pattern, triangles and squares"),
+        Option("plain", "smooth solid surface, no pattern"),
+    ],
+    colors=[
+        Color("ocean_blue", "#006994", "오션 블루", "ocean blue colored"),
+        Color("sunset_pink", "#FF6B6B", "선셋 핑크", "sunset pink and coral colored"),
+        Color("forest_green", "#228B22", "포레스트 그린", "deep forest green colored"),
+        Color("royal_purple", "#7851A9", "로열 퍼플", "rich royal purple colored"),
+        Color("golden", "#FFD700", "골든", "golden yellow colored"),
+        Color("midnight", "#191970", "미드나잇", "dark midnight blue and black colored"),
+        Color("rose", "#FF007F", "로즈", "soft rose pink colored"),
+        Color("mint", "#98FF98", "민트", "fresh mint green colored"),
+    ],
+)
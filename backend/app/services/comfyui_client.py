@@ -1,54 +1,453 @@
 import json
+import time
+import struct
 import uuid
+import random
 import asyncio
 import logging
-from typing import AsyncGenerator
+from collections import OrderedDict
+from pathlib import Path
+from typing import AsyncGenerator, Callable
 
+import aiofiles
+import aiofiles.os
 import httpx
 import websockets
 
 from app.config import settings
+from app.services.metrics import Timeline
 
 logger = logging.getLogger(__name__)
 
+# Status codes worth retrying: ComfyUI restarting or a proxy in front of it
+RETRYABLE_STATUS = {502, 503, 504}
+
+# Binary WebSocket frame types: a preview image (4-byte format code, then the
+# image) and, in newer builds, one prefixed with JSON metadata naming its prompt
+PREVIEW_IMAGE = 1
+PREVIEW_IMAGE_WITH_METADATA = 4
+PREVIEW_FORMATS = {1: "image/jpeg", 2: "image/png"}
+
+# Errors where the request never reached ComfyUI, safe to retry even for POST
+CONNECT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+
+class CircuitOpenError(Exception):
+    """Raised when ComfyUI calls are short-circuited after repeated failures."""
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker with a single half-open probe."""
+
+    def __init__(self, threshold: int, reset_timeout: float):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: float | None = None
+        self._probe_at: float | None = None
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open":
+            # Let one request through to test the backend; a probe that never
+            # reported back (cancelled) is replaced after another reset period
+            now = time.monotonic()
+            if self._probe_at is None or now - self._probe_at >= self.reset_timeout:
+                self._probe_at = now
+                return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self._probe_at = None
+
+    def record_failure(self):
+        self.failures += 1
+        if self.failures >= self.threshold:
+            if self.opened_at is None:
+                logger.warning(
+                    "ComfyUI circuit opened after %d failures", self.failures
+                )
+            self.opened_at = time.monotonic()
+        self._probe_at = None
+
+
+class ComfyUIEventStream:
+    """One persistent ComfyUI WebSocket per process, routed to prompt subscribers.
+
+    All prompts are submitted under a single clientId, so every event for our
+    jobs arrives on this socket and is dispatched to its subscriber's queue
+    with one dict lookup.
+    """
+
+    # Events that arrive before their prompt is subscribed (the WebSocket can
+    # beat the /prompt response) are held briefly, bounded by prompt count
+    MAX_ORPHANS = 64
+
+    def __init__(self, client: "ComfyUIClient"):
+        self.client = client
+        self.client_id = uuid.uuid4().hex
+        self._subscribers: dict[str, asyncio.Queue] = {}
+        self._orphans: OrderedDict[str, list[dict]] = OrderedDict()
+        self._current_prompt: str | None = None
+        self._task: asyncio.Task | None = None
+        self.connected = False
+        # Incremented on every (re)connect; ComfyUI restarts show up here
+        self.connections = 0
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self.connected = False
+
+    def subscribe(self, prompt_id: str) -> asyncio.Queue:
+        self.start()
+        queue: asyncio.Queue = asyncio.Queue()
+        for data in self._orphans.pop(prompt_id, ()):
+            queue.put_nowait(data)
+        self._subscribers[prompt_id] = queue
+        return queue
+
+    def unsubscribe(self, prompt_id: str):
+        self._subscribers.pop(prompt_id, None)
+
+    def fail_all(self, message: str):
+        """Terminate every tracked prompt, e.g. when the node is ejected."""
+        for prompt_id in list(self._subscribers):
+            self._dispatch({
+                "type": "execution_error",
+                "data": {"prompt_id": prompt_id, "exception_message": message},
+            })
+
+    async def _run(self):
+        url = f"{self.client.ws_url}/ws?clientId={self.client_id}"
+        delay = 0.5
+        while True:
+            try:
+                async with websockets.connect(url) as ws:
+                    self.connected = True
+                    self.connections += 1
+                    delay = 0.5
+                    logger.info("ComfyUI WebSocket connected (clientId=%s)", self.client_id)
+                    await self._resync()
+                    async for message in ws:
+                        if isinstance(message, bytes):
+                            self._dispatch_preview(message)
+                            continue
+                        self._dispatch(json.loads(message))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(
+                    "ComfyUI WebSocket error: %s — reconnecting in %.1fs", e, delay
+                )
+            self.connected = False
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 10.0)
+
+    def _dispatch(self, data: dict):
+        msg_type = data.get("type")
+        msg_data = data.get("data") or {}
+        prompt_id = msg_data.get("prompt_id")
+
+        if msg_type in ("execution_start", "executing") and prompt_id:
+            done = msg_type == "executing" and msg_data.get("node") is None
+            self._current_prompt = None if done else prompt_id
+        elif msg_type == "progress" and prompt_id is None:
+            # Older ComfyUI builds omit prompt_id on progress events
+            prompt_id = self._current_prompt
+
+        if prompt_id is None:
+            return
+
+        queue = self._subscribers.get(prompt_id)
+        if queue is not None:
+            queue.put_nowait(data)
+        elif msg_type != "progress":
+            self._orphans.setdefault(prompt_id, []).append(data)
+            while len(self._orphans) > self.MAX_ORPHANS:
+                self._orphans.popitem(last=False)
+
+    def _dispatch_preview(self, message: bytes):
+        """Route a sampler preview frame to the subscriber of its prompt."""
+        if len(message) < 8:
+            return
+        event_type, header = struct.unpack(">II", message[:8])
+        if event_type == PREVIEW_IMAGE:
+            prompt_id = self._current_prompt
+            media_type = PREVIEW_FORMATS.get(header)
+            image = message[8:]
+        elif event_type == PREVIEW_IMAGE_WITH_METADATA:
+            try:
+                metadata = json.loads(message[8:8 + header])
+            except ValueError:
+                return
+            prompt_id = metadata.get("prompt_id") or self._current_prompt
+            media_type = metadata.get("image_type")
+            image = message[8 + header:]
+        else:
+            return
+        queue = self._subscribers.get(prompt_id)
+        if queue is not None and media_type:
+            queue.put_nowait({
+                "type": "preview",
+                "data": {"prompt_id": prompt_id, "media_type": media_type, "image": image},
+            })
+
+    async def _resync(self):
+        """Settle prompts whose events were missed while we were disconnected."""
+        prompt_ids = list(self._subscribers)
+        if prompt_ids:
+            await self.settle(prompt_ids)
+
+    async def settle(self, prompt_ids: list[str]):
+        """Replay results of finished prompts and fail those ComfyUI lost.
+
+        A prompt in neither the queue nor the history was dropped, e.g. by a
+        ComfyUI restart, and would otherwise never send another event. The
+        queue is read first so a prompt finishing in between is in history.
+        """
+        try:
+            queued = await self.client.queued_prompts()
+        except Exception as e:
+            logger.warning("Queue lookup failed: %s", e)
+            return
+        for prompt_id in prompt_ids:
+            if prompt_id in queued:
+                continue
+            try:
+                entry = await self.client.get_history(prompt_id)
+            except Exception as e:
+                logger.warning("History lookup for %s failed: %s", prompt_id, e)
+                continue
+            if not entry:
+                logger.warning("Prompt %s was lost by ComfyUI", prompt_id)
+                self._dispatch({
+                    "type": "execution_error",
+                    "data": {"prompt_id": prompt_id, "exception_message": "Prompt was lost by ComfyUI"},
+                })
+                continue
+            for node_id, output in entry.get("outputs", {}).items():
+                self._dispatch({
+                    "type": "executed",
+                    "data": {"prompt_id": prompt_id, "node": node_id, "output": output},
+                })
+            if entry.get("status", {}).get("status_str") == "error":
+                self._dispatch({
+                    "type": "execution_error",
+                    "data": {"prompt_id": prompt_id, "exception_message": "Execution failed"},
+                })
+            else:
+                self._dispatch({
+                    "type": "executing",
+                    "data": {"prompt_id": prompt_id, "node": None},
+                })
+
 
 class ComfyUIClient:
-    def __init__(self):
-        self.base_url = settings.comfyui_url
-        self.ws_url = settings.comfyui_url.replace("http", "ws")
+    """Connection to a single ComfyUI instance."""
+
+    def __init__(self, base_url: str):
+        self.base_url = base_url
+        self.ws_url = base_url.replace("http", "ws")
+        self.breaker = CircuitBreaker(
+            settings.comfyui_breaker_threshold, settings.comfyui_breaker_reset
+        )
+        self._http: httpx.AsyncClient | None = None
+        self.events = ComfyUIEventStream(self)
+        # Node executions ComfyUI skipped because their outputs were cached
+        self.cached_nodes = 0
+
+    async def start(self):
+        """Create the shared connection pool and event stream. Called from the app lifespan."""
+        if self._http is None:
+            self._http = httpx.AsyncClient(
+                base_url=self.base_url,
+                limits=httpx.Limits(
+                    max_connections=settings.comfyui_max_connections,
+                    max_keepalive_connections=settings.comfyui_max_keepalive,
+                    keepalive_expiry=settings.comfyui_keepalive_expiry,
+                ),
+                timeout=httpx.Timeout(
+                    settings.comfyui_read_timeout,
+                    connect=settings.comfyui_connect_timeout,
+                ),
+            )
+        self.events.start()
+
+    async def close(self):
+        await self.events.close()
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+    @property
+    def http(self) -> httpx.AsyncClient:
+        if self._http is None:
+            # Used outside the app lifespan (scripts, tests) — create lazily
+            self._http = httpx.AsyncClient(base_url=self.base_url)
+        return self._http
+
+    async def _request(
+        self,
+        method: str,
+        path: str,
+        *,
+        idempotent: bool = True,
+        retries: int | None = None,
+        stream: bool = False,
+        **kwargs,
+    ) -> httpx.Response:
+        """Send a request through the pool with retries and the circuit breaker.
+
+        Non-idempotent requests are only retried when the connection could not
+        be established, so a prompt is never submitted twice. With
+        ``stream=True`` the body is left unread and the caller must close it.
+        """
+        if retries is None:
+            retries = settings.comfyui_retries
+
+        attempt = 0
+        while True:
+            if not self.breaker.allow():
+                raise CircuitOpenError("ComfyUI is unavailable (circuit open)")
+            try:
+                request = self.http.build_request(method, path, **kwargs)
+                response = await self.http.send(request, stream=stream)
+                if response.status_code in RETRYABLE_STATUS:
+                    await response.aclose()
+                    response.raise_for_status()
+            except httpx.HTTPStatusError as e:
+                self.breaker.record_failure()
+                error: Exception = e
+                retryable = idempotent
+            except CONNECT_ERRORS as e:
+                self.breaker.record_failure()
+                error = e
+                retryable = True
+            except httpx.TransportError as e:
+                self.breaker.record_failure()
+                error = e
+                retryable = idempotent
+            else:
+                if response.status_code >= 500:
+                    # Answered but failing: a node that keeps erroring must trip the breaker
+                    self.breaker.record_failure()
+                else:
+                    self.breaker.record_success()
+                return response
+
+            if not retryable or attempt >= retries:
+                raise error
+            delay = min(
+                settings.comfyui_retry_backoff * (2 ** attempt),
+                settings.comfyui_retry_backoff_max,
+            )
+            # Full jitter keeps a burst of callers from retrying in lockstep
+            delay = random.uniform(0, delay)
+            attempt += 1
+            logger.warning(
+                "ComfyUI %s %s failed (%s), retry %d/%d in %.2fs",
+                method, path, error, attempt, retries, delay,
+            )
+            await asyncio.sleep(delay)
 
     async def is_healthy(self) -> bool:
         """Check if ComfyUI is reachable."""
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.get(
-                    f"{self.base_url}/system_stats",
-                    timeout=5.0,
-                )
-                return response.status_code == 200
+            response = await self._request(
+                "GET", "/system_stats", retries=0, timeout=5.0
+            )
+            return response.status_code == 200
         except Exception:
             return False
 
-    async def queue_prompt(self, workflow: dict, client_id: str) -> str:
+    async def queue_prompt(self, workflow: dict) -> str:
         """Submit a workflow to ComfyUI and return the prompt_id."""
         payload = {
             "prompt": workflow,
-            "client_id": client_id,
+            "client_id": self.events.client_id,
         }
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                f"{self.base_url}/prompt",
-                json=payload,
-                timeout=30.0,
-            )
+        response = await self._request(
+            "POST", "/prompt", json=payload, idempotent=False
+        )
+        response.raise_for_status()
+        data = response.json()
+        return data["prompt_id"]
+
+    async def queued_prompts(self) -> set[str]:
+        """Ids of every prompt running or pending in ComfyUI."""
+        response = await self._request("GET", "/queue", retries=1)
+        response.raise_for_status()
+        queue = response.json()
+        return {entry[1] for entry in queue.get("queue_running", []) + queue.get("queue_pending", [])}
+
+    async def _queue_state(self, prompt_id: str) -> str | None:
+        """"pending", "executing" or None, from a fresh read of ComfyUI's queue."""
+        response = await self._request("GET", "/queue", retries=1)
+        response.raise_for_status()
+        queue = response.json()
+        if any(entry[1] == prompt_id for entry in queue.get("queue_running", [])):
+            return "executing"
+        if any(entry[1] == prompt_id for entry in queue.get("queue_pending", [])):
+            return "pending"
+        return None
+
+    async def cancel(self, prompt_id: str) -> str | None:
+        """Stop a prompt: drop it from ComfyUI's queue or interrupt its execution.
+
+        Returns "pending" or "executing" for where it was found, or None if it
+        had already finished.
+        """
+        state = await self._queue_state(prompt_id)
+        if state == "pending":
+            response = await self._request("POST", "/queue", json={"delete": [prompt_id]}, retries=1)
             response.raise_for_status()
-            data = response.json()
-            return data["prompt_id"]
+            # It may have started between the read and the delete
+            state = await self._queue_state(prompt_id)
+            if state != "executing":
+                return "pending"
+        # Builds that ignore prompt_id interrupt whatever runs: only ask right
+        # after a read that still shows this prompt running
+        if state != "executing":
+            return None
+        response = await self._request("POST", "/interrupt", json={"prompt_id": prompt_id}, retries=1)
+        response.raise_for_status()
+        return "executing"
+
+    async def get_history(self, prompt_id: str) -> dict | None:
+        """Return ComfyUI's history entry for a prompt, or None if unfinished."""
+        response = await self._request("GET", f"/history/{prompt_id}")
+        response.raise_for_status()
+        return response.json().get(prompt_id)
 
     async def track_progress(
-        self, prompt_id: str, client_id: str
+        self,
+        prompt_id: str,
+        timeline: Timeline | None = None,
+        on_preview: Callable[[str, bytes], None] | None = None,
     ) -> AsyncGenerator[dict, None]:
-        """Connect to ComfyUI WebSocket and yield progress events.
+        """Subscribe to the shared ComfyUI event stream and yield progress events.
 
         ComfyUI WebSocket event flow:
         1. status         - queue info
@@ -57,87 +456,102 @@ class ComfyUIClient:
         4. progress       - KSampler step progress
         5. executed        - node output (SaveImage has images array)
         6. execution_error - on failure
+
+        Milestones from execution_start to executed are marked on ``timeline``;
+        sampler preview frames are passed to ``on_preview(media_type, image)``.
+        After ``comfyui_watchdog_interval`` without an event the prompt is
+        looked up, so a lost event or prompt cannot stall tracking forever.
         """
-        ws_url = f"{self.ws_url}/ws?clientId={client_id}"
-        image_info = None
+        queue = self.events.subscribe(prompt_id)
+        images: list[dict] = []
 
         try:
-            async with websockets.connect(ws_url) as ws:
-                async for message in ws:
-                    if isinstance(message, bytes):
-                        # ComfyUI sends binary preview frames — skip them
-                        continue
-
-                    data = json.loads(message)
-                    msg_type = data.get("type")
-
-                    if msg_type == "progress":
-                        # KSampler step-by-step progress
-                        msg_data = data.get("data", {})
-                        if msg_data.get("prompt_id", prompt_id) == prompt_id:
-                            value = msg_data["value"]
-                            max_val = msg_data["max"]
-                            yield {
-                                "status": "generating",
-                                "progress": value / max_val,
-                                "step": value,
-                                "total_steps": max_val,
-                            }
-
-                    elif msg_type == "executed":
-                        # A node finished — only SaveImage nodes produce images
-                        msg_data = data.get("data", {})
-                        if msg_data.get("prompt_id") == prompt_id:
-                            output = msg_data.get("output", {})
-                            images = output.get("images", [])
-                            if images:
-                                image_info = images[0]
-                                logger.info(
-                                    "Image output captured: %s",
-                                    image_info.get("filename"),
-                                )
-
-                    elif msg_type == "executing":
-                        # node=null signals prompt execution is complete
-                        msg_data = data.get("data", {})
-                        if msg_data.get("prompt_id") == prompt_id:
-                            if msg_data.get("node") is None:
-                                if image_info:
-                                    yield {
-                                        "status": "complete",
-                                        "progress": 1.0,
-                                        "image_filename": image_info.get("filename"),
-                                        "subfolder": image_info.get("subfolder", ""),
-                                    }
-                                else:
-                                    yield {
-                                        "status": "complete",
-                                        "progress": 1.0,
-                                    }
-                                return
-
-                    elif msg_type == "execution_error":
-                        msg_data = data.get("data", {})
-                        if msg_data.get("prompt_id") == prompt_id:
-                            error_msg = msg_data.get(
-                                "exception_message",
-                                msg_data.get("traceback", "Unknown error"),
+            while True:
+                try:
+                    data = await asyncio.wait_for(queue.get(), settings.comfyui_watchdog_interval)
+                except asyncio.TimeoutError:
+                    await self.events.settle([prompt_id])
+                    continue
+                msg_type = data.get("type")
+                msg_data = data.get("data", {})
+
+                if msg_type == "progress":
+                    # KSampler step-by-step progress
+                    value = msg_data["value"]
+                    max_val = msg_data["max"]
+                    if timeline is not None:
+                        timeline.mark("first_step")
+                        if value == max_val:
+                            timeline.mark("last_step")
+                            timeline.steps = max_val
+                    yield {
+                        "status": "generating",
+                        "progress": value / max_val,
+                        "step": value,
+                        "total_steps": max_val,
+                    }
+
+                elif msg_type == "executed":
+                    # A node finished — only SaveImage nodes produce images.
+                    # A batched prompt reports every variant in one output.
+                    output = msg_data.get("output", {})
+                    for image in output.get("images", []):
+                        if image.get("type", "output") == "output":
+                            images.append({
+                                "filename": image.get("filename"),
+                                "subfolder": image.get("subfolder", ""),
+                            })
+                            logger.info(
+                                "Image output captured: %s",
+                                image.get("filename"),
                             )
-                            logger.error("ComfyUI execution error: %s", error_msg)
-                            yield {
-                                "status": "error",
-                                "progress": 0,
-                                "message": str(error_msg),
-                            }
-                            return
-
-        except websockets.exceptions.ConnectionClosedError as e:
-            logger.error("WebSocket connection closed: %s", e)
-            yield {
-                "status": "error",
-                "progress": 0,
-                "message": f"WebSocket connection lost: {e}",
-            }
+
+                elif msg_type == "executing":
+                    # node=null signals prompt execution is complete
+                    if msg_data.get("node") is None:
+                        if timeline is not None:
+                            timeline.mark("executed")
+                        yield {
+                            "status": "complete",
+                            "progress": 1.0,
+                            "images": images,
+                        }
+                        return
+
+                elif msg_type == "preview":
+                    if on_preview is not None:
+                        on_preview(msg_data["media_type"], msg_data["image"])
+
+                elif msg_type == "execution_start":
+                    if timeline is not None:
+                        timeline.mark("execution_start")
+
+                elif msg_type == "execution_cached":
+                    self.cached_nodes += len(msg_data.get("nodes", []))
+
+                elif msg_type == "execution_interrupted":
+                    # Not necessarily a failure: our own cancel, or a stray
+                    # interrupt aimed at another prompt; the caller decides
+                    yield {
+                        "status": "interrupted",
+                        "progress": 0,
+                        "message": "Execution interrupted",
+                    }
+                    return
+
+                elif msg_type == "execution_error":
+                    error_msg = msg_data.get(
+                        "exception_message",
+                        msg_data.get("traceback", "Unknown error"),
+                    )
+                    logger.error("ComfyUI execution error: %s", error_msg)
+                    yield {
+                        "status": "error",
+                        "progress": 0,
+                        "message": str(error_msg),
+                    }
+                    return
+
         except Exception as e:
             logger.error("ComfyUI tracking error: %s", e)
             yield {
@@ -145,18 +559,267 @@ class ComfyUIClient:
                 "progress": 0,
                 "message": str(e),
             }
+        finally:
+            self.events.unsubscribe(prompt_id)
+
+    async def download_image(self, filename: str, subfolder: str, dest: Path):
+        """Stream a generated image from ComfyUI into ``dest``.
 
-    async def get_image(self, filename: str, subfolder: str = "") -> bytes:
-        """Fetch a generated image from ComfyUI."""
+        Chunks go to a temp file beside ``dest`` through aiofiles, so memory
+        use is constant and the event loop never blocks on disk; the file is
+        renamed into place only once complete.
+        """
         params = {"filename": filename, "subfolder": subfolder, "type": "output"}
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"{self.base_url}/view",
-                params=params,
-                timeout=30.0,
-            )
+        tmp = dest.with_name(f".{dest.name}.part")
+        response = await self._request("GET", "/view", params=params, stream=True)
+        try:
             response.raise_for_status()
-            return response.content
+            async with aiofiles.open(tmp, "wb") as f:
+                async for chunk in response.aiter_bytes(settings.image_chunk_size):
+                    await f.write(chunk)
+            await aiofiles.os.replace(tmp, dest)
+        except BaseException:
+            if await aiofiles.os.path.exists(tmp):
+                await aiofiles.os.remove(tmp)
+            raise
+        finally:
+            await response.aclose()
+
+
+class ComfyUINode(ComfyUIClient):
+    """A pool member with health state and outstanding-work accounting.
+
+    ``healthy`` nodes receive new prompts. After one failed health check a
+    node is ``draining``: prompts already on it keep running, but nothing new
+    is routed there. After ``comfyui_eject_after`` consecutive failures it is
+    ``ejected`` and its tracked prompts fail fast. One good check restores it.
+    """
+
+    def __init__(self, base_url: str):
+        super().__init__(base_url)
+        self.state = "healthy"
+        self.check_failures = 0
+        self.queue_depth = 0
+        # prompt_id -> prompts ahead of it in ComfyUI's queue, as of the last check
+        self.queue_ahead: dict[str, int] = {}
+        self.outstanding = 0
+        # Event stream connection on which the warm-up render last succeeded
+        self.warmed_connection: int | None = None
+
+    @property
+    def warm(self) -> bool:
+        """Models are loaded: warmed up since the current connection was made."""
+        if not settings.warmup_enabled:
+            return True
+        return self.events.connected and self.warmed_connection == self.events.connections
+
+    @property
+    def accepting(self) -> bool:
+        return self.state == "healthy" and self.breaker.state != "open"
+
+    @property
+    def load(self) -> int:
+        # ComfyUI's own queue includes our prompts plus anyone else's
+        return max(self.outstanding, self.queue_depth)
+
+    async def check(self):
+        try:
+            stats = await self._request("GET", "/system_stats", retries=0, timeout=5.0)
+            stats.raise_for_status()
+            queue = await self._request("GET", "/queue", retries=0, timeout=5.0)
+            queue.raise_for_status()
+            data = queue.json()
+        except Exception as e:
+            self.check_failures += 1
+            if self.check_failures >= settings.comfyui_eject_after:
+                if self.state != "ejected":
+                    logger.error("ComfyUI node %s ejected: %s", self.base_url, e)
+                    self.events.fail_all(f"ComfyUI node {self.base_url} is unavailable")
+                self.state = "ejected"
+            elif self.state == "healthy":
+                logger.warning("ComfyUI node %s draining: %s", self.base_url, e)
+                self.state = "draining"
+            return
+
+        if self.state != "healthy":
+            logger.info("ComfyUI node %s healthy again", self.base_url)
+        self.state = "healthy"
+        self.check_failures = 0
+        running = data.get("queue_running", [])
+        pending = sorted(data.get("queue_pending", []), key=lambda entry: entry[0])
+        self.queue_depth = len(running) + len(pending)
+        self.queue_ahead = {entry[1]: i for i, entry in enumerate(running + pending)}
+
+    def status(self) -> dict:
+        return {
+            "url": self.base_url,
+            "state": self.state,
+            "circuit": self.breaker.state,
+            "queue_depth": self.queue_depth,
+            "outstanding": self.outstanding,
+            "cached_nodes": self.cached_nodes,
+            "warm": self.warm,
+        }
+
+
+class ComfyUIPool:
+    """Routes prompts across ComfyUI nodes by least outstanding work.
+
+    A prompt stays on the node that accepted it: progress tracking and image
+    fetches for that prompt_id always go to the same node.
+    """
+
+    # Remembered prompt -> node assignments, for fetches after tracking ends
+    MAX_ASSIGNMENTS = 4096
+
+    def __init__(self, urls: list[str]):
+        self.nodes = [ComfyUINode(url) for url in urls]
+        self._assignments: OrderedDict[str, ComfyUINode] = OrderedDict()
+        # Prompts counted in their node's ``outstanding``, until released
+        self._outstanding: dict[str, ComfyUINode] = {}
+        self._health_task: asyncio.Task | None = None
+
+    @property
+    def primary(self) -> ComfyUINode:
+        """The node whose output directory is mounted at comfyui_output_dir."""
+        return self.nodes[0]
+
+    @property
+    def available(self) -> bool:
+        return any(node.accepting for node in self.nodes)
+
+    @property
+    def ready(self) -> bool:
+        """At least one node accepts work and has its models loaded."""
+        return any(node.accepting and node.warm for node in self.nodes)
+
+    async def start(self):
+        for node in self.nodes:
+            await node.start()
+        if self._health_task is None:
+            self._health_task = asyncio.create_task(self._health_loop())
+
+    async def close(self):
+        if self._health_task is not None:
+            self._health_task.cancel()
+            try:
+                await self._health_task
+            except asyncio.CancelledError:
+                pass
+            self._health_task = None
+        for node in self.nodes:
+            await node.close()
+
+    async def _health_loop(self):
+        while True:
+            await asyncio.gather(*(node.check() for node in self.nodes))
+            await asyncio.sleep(settings.comfyui_health_interval)
+
+    async def is_healthy(self) -> bool:
+        results = await asyncio.gather(*(node.is_healthy() for node in self.nodes))
+        return any(results)
+
+    def status(self) -> list[dict]:
+        return [node.status() for node in self.nodes]
+
+    @property
+    def cached_nodes(self) -> int:
+        return sum(node.cached_nodes for node in self.nodes)
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(node.queue_depth for node in self.nodes)
+
+    def prompts_ahead(self, prompt_id: str) -> int | None:
+        """Prompts ComfyUI runs before this one, or None if it is not queued."""
+        for node in self.nodes:
+            ahead = node.queue_ahead.get(prompt_id)
+            if ahead is not None:
+                return ahead
+        return None
+
+    def node_for(self, prompt_id: str) -> ComfyUINode:
+        node = self._assignments.get(prompt_id)
+        if node is None:
+            raise KeyError(f"Unknown prompt {prompt_id}")
+        return node
+
+    def _candidates(self) -> list[ComfyUINode]:
+        # Warm nodes first: a cold one would make a prompt pay the model load
+        return sorted(
+            (node for node in self.nodes if node.accepting),
+            key=lambda node: (not node.warm, node.load),
+        )
+
+    def next_node(self) -> str | None:
+        """URL of the node the next prompt would be submitted to."""
+        candidates = self._candidates()
+        return candidates[0].base_url if candidates else None
+
+    async def queue_prompt(self, workflow: dict) -> str:
+        """Submit to the least-loaded accepting node, failing over on errors."""
+        candidates = self._candidates()
+        if not candidates:
+            raise CircuitOpenError("No ComfyUI node is available")
+
+        error: Exception | None = None
+        for node in candidates:
+            # Count the prompt before awaiting so concurrent submissions spread out
+            node.outstanding += 1
+            try:
+                prompt_id = await node.queue_prompt(workflow)
+            except (CircuitOpenError, *CONNECT_ERRORS) as e:
+                # Only failures before the request went out; after a read error
+                # the node may have queued the prompt and trying another would
+                # render it twice
+                node.outstanding -= 1
+                logger.warning("ComfyUI node %s rejected prompt: %s", node.base_url, e)
+                error = e
+                continue
+            except BaseException:
+                node.outstanding -= 1
+                raise
+            self._assignments[prompt_id] = node
+            self._outstanding[prompt_id] = node
+            while len(self._assignments) > self.MAX_ASSIGNMENTS:
+                self._assignments.popitem(last=False)
+            return prompt_id
+        raise error
+
+    async def track_progress(
+        self,
+        prompt_id: str,
+        timeline: Timeline | None = None,
+        on_preview: Callable[[str, bytes], None] | None = None,
+    ) -> AsyncGenerator[dict, None]:
+        node = self.node_for(prompt_id)
+        try:
+            async for event in node.track_progress(prompt_id, timeline, on_preview):
+                yield event
+        finally:
+            self.release(prompt_id)
+
+    def release(self, prompt_id: str):
+        """Stop counting a prompt as outstanding work on its node; idempotent."""
+        node = self._outstanding.pop(prompt_id, None)
+        if node is not None:
+            node.outstanding -= 1
+
+    async def get_history(self, prompt_id: str) -> dict | None:
+        return await self.node_for(prompt_id).get_history(prompt_id)
+
+    async def cancel(self, prompt_id: str) -> str | None:
+        return await self.node_for(prompt_id).cancel(prompt_id)
+
+    async def withdraw(self, prompt_id: str) -> str | None:
+        """Cancel a prompt that may never be tracked, and release its node."""
+        try:
+            return await self.cancel(prompt_id)
+        finally:
+            self.release(prompt_id)
+
+    async def download_image(self, prompt_id: str, filename: str, subfolder: str, dest: Path):
+        await self.node_for(prompt_id).download_image(filename, subfolder, dest)
 
 
-comfyui_client = ComfyUIClient()
+comfyui_client = ComfyUIPool(settings.comfyui_urls)
@@ -1,72 +1,100 @@
 import random
+import secrets
+from collections import OrderedDict
 from app.models.schemas import GachaSpinResponse
+from app.services.catalog import catalog
 
-BASE_ELEMENTS = [
-    {
-        "base_element": "crystal",
-        "display_name": "신비한 크리스탈",
-        "rarity": "rare",
-        "icon": "💎",
-        "weight": 10,
-    },
-    {
-        "base_element": "wood",
-        "display_name": "나무 조각",
-        "rarity": "common",
-        "icon": "🪵",
-        "weight": 25,
-    },
-    {
-        "base_element": "metal",
-        "display_name": "금속 파편",
-        "rarity": "common",
-        "icon": "⚙️",
-        "weight": 25,
-    },
-    {
-        "base_element": "plush",
-        "display_name": "봉제 인형",
-        "rarity": "uncommon",
-        "icon": "🧸",
-        "weight": 15,
-    },
-    {
-        "base_element": "glass",
-        "display_name": "유리 구슬",
-        "rarity": "uncommon",
-        "icon": "🔮",
-        "weight": 15,
-    },
-    {
-        "base_element": "clay",
-        "display_name": "점토 덩어리",
-        "rarity": "common",
-        "icon": "🏺",
-        "weight": 20,
-    },
-    {
-        "base_element": "resin",
-        "display_name": "레진 캡슐",
-        "rarity": "rare",
-        "icon": "💧",
-        "weight": 10,
-    },
-    {
-        "base_element": "enchanted",
-        "display_name": "마법의 정수",
-        "rarity": "legendary",
-        "icon": "✨",
-        "weight": 5,
-    },
-]
-
-
-def spin_gacha() -> GachaSpinResponse:
-    weights = [e["weight"] for e in BASE_ELEMENTS]
-    chosen = random.choices(BASE_ELEMENTS, weights=weights, k=1)[0]
-    return GachaSpinResponse(
-        base_element=chosen["base_element"],
-        display_name=chosen["display_name"],
-        rarity=chosen["rarity"],
-        icon=chosen["icon"],
-    )
+# Draw order of the alias table; weights come from the catalog
+BASE_ELEMENTS = list(catalog.base_elements.values())
+
+
+class AliasTable:
+    """Walker/Vose alias table: O(n) to build, O(1) and one RNG call per draw."""
+
+    def __init__(self, weights: list[float]):
+        n = len(weights)
+        total = sum(weights)
+        scaled = [w * n / total for w in weights]
+        self.n = n
+        self.prob = [1.0] * n
+        self.alias = list(range(n))
+
+        small = [i for i, p in enumerate(scaled) if p < 1.0]
+        large = [i for i, p in enumerate(scaled) if p >= 1.0]
+        while small and large:
+            s, l = small.pop(), large.pop()
+            self.prob[s] = scaled[s]
+            self.alias[s] = l
+            scaled[l] -= 1.0 - scaled[s]
+            (small if scaled[l] < 1.0 else large).append(l)
+        # Leftovers are 1.0 up to float rounding
+        for i in small + large:
+            self.prob[i] = 1.0
+
+    def draw(self, rng: random.Random) -> int:
+        u = rng.random() * self.n
+        i = int(u)
+        return i if u - i < self.prob[i] else self.alias[i]
+
+
+_table: AliasTable
+_results: list[GachaSpinResponse]
+
+
+def rebuild_gacha_table():
+    """Recompute the alias table; call after changing BASE_ELEMENTS weights."""
+    global _table, _results
+    _table = AliasTable([e.weight for e in BASE_ELEMENTS])
+    _results = [
+        GachaSpinResponse(
+            base_element=e.id,
+            display_name=e.display_name,
+            rarity=e.rarity,
+            icon=e.icon,
+        )
+        for e in BASE_ELEMENTS
+    ]
+
+
+rebuild_gacha_table()
+
+
+class GachaSession:
+    """A seeded RNG whose draws can be replayed from (seed, draw index)."""
+
+    def __init__(self, seed: int):
+        self.seed = seed
+        self.rng = random.Random(seed)
+        self.draws = 0
+
+
+class SeedMismatchError(Exception):
+    """Raised when an existing session is continued with a different seed."""
+
+
+# Seeded sessions kept per process, least recently used dropped first
+MAX_SESSIONS = 10000
+_sessions: OrderedDict[str, GachaSession] = OrderedDict()
+
+
+def get_session(session_id: str, seed: int | None = None) -> GachaSession:
+    session = _sessions.get(session_id)
+    if session is None:
+        session = GachaSession(seed if seed is not None else secrets.randbits(64))
+        _sessions[session_id] = session
+        while len(_sessions) > MAX_SESSIONS:
+            _sessions.popitem(last=False)
+    elif seed is not None and seed != session.seed:
+        raise SeedMismatchError(f"Session {session_id} was started with a different seed")
+    _sessions.move_to_end(session_id)
+    return session
+
+
+def spin_gacha(rng: random.Random | None = None) -> GachaSpinResponse:
+    return _results[_table.draw(rng or random)]
+
+
+def spin_gacha_bulk(count: int, rng: random.Random | None = None) -> list[GachaSpinResponse]:
+    rng = rng or random
+    draw = _table.draw
+    return [_results[draw(rng)] for _ in range(count)]
@@ -0,0 +1,29 @@
+from typing import Awaitable, Callable
+
+from fastapi import HTTPException
+
+from app.services.broker import broker, BrokerUnavailableError
+
+
+def hub_service(handler: Callable[[dict], Awaitable[dict]]) -> Callable[[dict], Awaitable[dict]]:
+    """Wrap a hub-side handler so HTTP errors travel back to the calling worker."""
+
+    async def serve(payload: dict) -> dict:
+        try:
+            return await handler(payload)
+        except HTTPException as e:
+            return {"error": {"status_code": e.status_code, "detail": e.detail, "headers": e.headers}}
+
+    return serve
+
+
+async def call_hub(name: str, payload: dict) -> dict:
+    """Run a service on the hub worker, re-raising the HTTP error it answered with."""
+    try:
+        result = await broker.call(name, payload)
+    except BrokerUnavailableError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    error = result.get("error")
+    if error is not None:
+        raise HTTPException(**error)
+    return result
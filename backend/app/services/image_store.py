@@ -0,0 +1,85 @@
+import os
+import asyncio
+import logging
+from pathlib import Path
+
+import aiofiles.os
+
+from app.config import settings
+from app.services.comfyui_client import comfyui_client
+
+logger = logging.getLogger(__name__)
+
+
+def image_path(generation_id: str, index: int = 0) -> Path:
+    """Where variant ``index`` of a generation is stored; variant 0 keeps the plain name."""
+    name = generation_id if index == 0 else f"{generation_id}_{index}"
+    return Path(settings.image_output_dir) / f"{name}.png"
+
+
+def image_url(generation_id: str, index: int = 0) -> str:
+    if index == 0:
+        return f"/api/images/{generation_id}"
+    return f"/api/images/{generation_id}/{index}"
+
+
+def thumbnail_path(generation_id: str, index: int = 0) -> Path:
+    return image_path(generation_id, index).with_suffix(".thumb.jpg")
+
+
+def thumbnail_url(generation_id: str, index: int = 0) -> str:
+    if index == 0:
+        return f"/api/thumbnails/{generation_id}"
+    return f"/api/thumbnails/{generation_id}/{index}"
+
+
+def shared_output_path(filename: str, subfolder: str = "") -> Path | None:
+    """Resolve a ComfyUI output file in the shared volume, if it is mounted here."""
+    root = Path(settings.comfyui_output_dir).resolve()
+    source = (root / subfolder / filename).resolve()
+    if not source.is_relative_to(root) or not source.is_file():
+        return None
+    return source
+
+
+def link_into_store(source: Path, dest: Path) -> str:
+    """Place ``source`` at ``dest`` without copying bytes.
+
+    A hard link survives ComfyUI output cleanup but only works within one
+    filesystem mount; across Docker volumes it fails with EXDEV and the file
+    is served in place through a symlink instead.
+    """
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    tmp = dest.with_name(f".{dest.name}.link")
+    tmp.unlink(missing_ok=True)
+    try:
+        os.link(source, tmp)
+        method = "hardlink"
+    except OSError:
+        os.symlink(source, tmp)
+        method = "symlink"
+    os.replace(tmp, dest)
+    return method
+
+
+async def store_image(generation_id: str, index: int, image: dict, prompt_id: str) -> Path:
+    """Persist one ComfyUI output image for a generation and return its path."""
+    path = image_path(generation_id, index)
+    filename = image["filename"]
+    subfolder = image.get("subfolder", "")
+
+    # Only the primary node writes into the mounted volume; other nodes'
+    # outputs could share a filename with an unrelated local file
+    node = comfyui_client.node_for(prompt_id)
+    if settings.image_storage_mode == "link" and node is comfyui_client.primary:
+        source = shared_output_path(filename, subfolder)
+        if source is not None:
+            method = await asyncio.to_thread(link_into_store, source, path)
+            logger.info("Image linked (%s): %s", method, path)
+            return path
+
+    # Shared volume not mounted (or disabled): stream it over HTTP
+    await aiofiles.os.makedirs(path.parent, exist_ok=True)
+    await comfyui_client.download_image(prompt_id, filename, subfolder, path)
+    logger.info("Image saved: %s", path)
+    return path
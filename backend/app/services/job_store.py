@@ -0,0 +1,307 @@
+import json
+import time
+import asyncio
+import sqlite3
+import logging
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+TERMINAL_STATUSES = ("complete", "error", "cancelled")
+
+
+class JobRecord:
+    """Compact per-job state. Unset fields cost nothing beyond their slot."""
+
+    FIELDS = (
+        "status",
+        "progress",
+        "step",
+        "total_steps",
+        "queue_position",
+        "prompt_id",
+        "images",
+        "image_url",
+        "image_urls",
+        "message",
+        "preview",
+        "tier",
+        "thumbnail_url",
+        "thumbnail_urls",
+        "estimated_seconds",
+    )
+    __slots__ = FIELDS + ("updated_at",)
+
+    def __init__(self, **fields):
+        for name in self.FIELDS:
+            setattr(self, name, None)
+        self.status = "queued"
+        self.progress = 0
+        self.update(**fields)
+
+    def update(self, **fields):
+        for name, value in fields.items():
+            setattr(self, name, value)
+        self.updated_at = time.time()
+
+    @property
+    def terminal(self) -> bool:
+        return self.status in TERMINAL_STATUSES
+
+    def to_dict(self) -> dict:
+        data = {}
+        for name in self.FIELDS:
+            value = getattr(self, name)
+            if value is not None:
+                data[name] = value
+        return data
+
+
+class MemoryJobStore:
+    """In-process job records with LRU and TTL eviction of finished jobs.
+
+    Jobs that are still queued or running are kept (the scheduler already
+    bounds how many exist). Mirrors of another worker's active jobs are
+    dropped if they have not been updated for a TTL (that worker died);
+    jobs this worker owns are pinned until they finish.
+    """
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._records: OrderedDict[str, JobRecord] = OrderedDict()
+        self.pinned: set[str] = set()
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def get(self, job_id: str) -> JobRecord | None:
+        record = self._records.get(job_id)
+        if record is not None:
+            self._records.move_to_end(job_id)
+        return record
+
+    def put(self, job_id: str, record: JobRecord):
+        self._records[job_id] = record
+        self._records.move_to_end(job_id)
+        self.evict()
+
+    def delete(self, job_id: str):
+        self._records.pop(job_id, None)
+        self.pinned.discard(job_id)
+
+    def evict(self):
+        """Drop expired records and trim to ``max_entries``."""
+        expire_before = time.time() - self.ttl
+        excess = len(self._records) - self.max_entries
+        victims = []
+        for job_id, record in self._records.items():
+            if not record.terminal:
+                # Mirrored active jobs stay unless silent for a whole TTL
+                if record.updated_at < expire_before and job_id not in self.pinned:
+                    victims.append(job_id)
+                continue
+            if excess <= 0 and record.updated_at >= expire_before:
+                # Records are in access order; everything after is newer
+                break
+            victims.append(job_id)
+            excess -= 1
+        for job_id in victims:
+            del self._records[job_id]
+        self.evictions += len(victims)
+
+
+class SQLiteJobStore:
+    """Finished jobs persisted in a local SQLite database (WAL mode).
+
+    Only terminal state is written, once per job, so lookups of old jobs
+    survive restarts and memory eviction without a write per progress tick.
+    Writes are buffered and committed in one transaction per ``flush``, on a
+    worker thread with its own connection; reads see buffered rows first.
+    """
+
+    def __init__(self, path: str):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._db = self._connect(path)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id TEXT PRIMARY KEY,"
+            " status TEXT NOT NULL,"
+            " data TEXT NOT NULL,"
+            " updated_at REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS jobs_updated_at ON jobs (updated_at)")
+        self._writer = self._connect(path)
+        # A write cancelled on the loop side still finishes in its thread
+        self._write_lock = threading.Lock()
+        # Rows not yet committed, latest per job; None marks a delete
+        self._pending: dict[str, tuple | None] = {}
+        self._flushing: dict[str, tuple | None] = {}
+
+    @staticmethod
+    def _connect(path: str) -> sqlite3.Connection:
+        db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        return db
+
+    def get(self, job_id: str) -> JobRecord | None:
+        for buffer in (self._pending, self._flushing):
+            if job_id in buffer:
+                row = buffer[job_id]
+                return JobRecord(**json.loads(row[2])) if row is not None else None
+        row = self._db.execute("SELECT data FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        return JobRecord(**json.loads(row[0]))
+
+    def put(self, job_id: str, record: JobRecord):
+        self._pending[job_id] = (job_id, record.status, json.dumps(record.to_dict()), record.updated_at)
+
+    def delete(self, job_id: str):
+        self._pending[job_id] = None
+
+    async def flush(self):
+        """Commit buffered writes in one transaction, off the event loop."""
+        if not self._pending:
+            return
+        self._flushing, self._pending = self._pending, {}
+        try:
+            await asyncio.to_thread(self._write, self._flushing)
+        except Exception as e:
+            logger.error("Persisting %d jobs failed: %s", len(self._flushing), e)
+            # Retried with the next flush, unless a newer write replaced it
+            self._pending = {**self._flushing, **self._pending}
+        finally:
+            self._flushing = {}
+
+    def _write(self, rows: dict[str, tuple | None]):
+        with self._write_lock:
+            self._writer.execute("BEGIN")
+            try:
+                self._writer.executemany(
+                    "INSERT OR REPLACE INTO jobs (id, status, data, updated_at) VALUES (?, ?, ?, ?)",
+                    [row for row in rows.values() if row is not None],
+                )
+                self._writer.executemany(
+                    "DELETE FROM jobs WHERE id = ?",
+                    [(job_id,) for job_id, row in rows.items() if row is None],
+                )
+                self._writer.execute("COMMIT")
+            except BaseException:
+                self._writer.execute("ROLLBACK")
+                raise
+
+    def purge(self, older_than: float) -> int:
+        with self._write_lock:
+            cursor = self._writer.execute("DELETE FROM jobs WHERE updated_at < ?", (older_than,))
+        return cursor.rowcount
+
+    async def close(self):
+        await self.flush()
+        with self._write_lock:
+            self._writer.close()
+        self._db.close()
+
+
+class JobStore:
+    """Generation state: a bounded hot tier in memory, finished jobs optionally persisted.
+
+    Records are read and written through here; ``get`` returns a plain dict
+    snapshot so callers cannot mutate stored state behind the store's back.
+    Once started, a background task flushes persisted writes every
+    ``job_store_flush_interval`` and evicts expired jobs every
+    ``job_store_sweep_interval``, even while no new jobs arrive.
+    """
+
+    def __init__(self, memory: MemoryJobStore, persistent: SQLiteJobStore | None = None):
+        self.memory = memory
+        self.persistent = persistent
+        self._task: asyncio.Task | None = None
+
+    def __contains__(self, job_id: str) -> bool:
+        return self._record(job_id) is not None
+
+    def _record(self, job_id: str) -> JobRecord | None:
+        record = self.memory.get(job_id)
+        if record is None and self.persistent is not None:
+            record = self.persistent.get(job_id)
+        return record
+
+    def create(self, job_id: str, **fields):
+        """Add a job owned by this worker; it cannot be evicted until it finishes."""
+        self.memory.pinned.add(job_id)
+        self.memory.put(job_id, JobRecord(**fields))
+
+    def get(self, job_id: str) -> dict | None:
+        record = self._record(job_id)
+        return record.to_dict() if record is not None else None
+
+    def update(self, job_id: str, **fields):
+        record = self.memory.get(job_id)
+        if record is None:
+            raise KeyError(job_id)
+        was_terminal = record.terminal
+        record.update(**fields)
+        if record.terminal:
+            self.memory.pinned.discard(job_id)
+        if self.persistent is not None and (record.terminal or was_terminal):
+            self.persistent.put(job_id, record)
+
+    def replace(self, job_id: str, snapshot: dict):
+        """Adopt a snapshot published by another worker; that worker persists it."""
+        self.memory.put(job_id, JobRecord(**snapshot))
+
+    def delete(self, job_id: str):
+        self.memory.delete(job_id)
+        if self.persistent is not None:
+            self.persistent.delete(job_id)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._maintain())
+
+    async def _maintain(self):
+        last_sweep = time.monotonic()
+        while True:
+            await asyncio.sleep(settings.job_store_flush_interval)
+            if self.persistent is not None:
+                await self.persistent.flush()
+            if time.monotonic() - last_sweep < settings.job_store_sweep_interval:
+                continue
+            last_sweep = time.monotonic()
+            self.memory.evict()
+            if self.persistent is not None:
+                try:
+                    await asyncio.to_thread(
+                        self.persistent.purge, time.time() - settings.job_store_persist_ttl
+                    )
+                except Exception as e:
+                    logger.error("Purging expired jobs failed: %s", e)
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self.persistent is not None:
+            await self.persistent.close()
+
+
+def create_job_store() -> JobStore:
+    memory = MemoryJobStore(settings.job_store_max_entries, settings.job_store_ttl)
+    persistent = None
+    if settings.job_store_backend == "sqlite":
+        persistent = SQLiteJobStore(settings.job_store_path)
+        purged = persistent.purge(time.time() - settings.job_store_persist_ttl)
+        if purged:
+            logger.info("Purged %d expired jobs from %s", purged, settings.job_store_path)
+    return JobStore(memory, persistent)
+
+
+job_store = create_job_store()
@@ -0,0 +1,247 @@
+import math
+import time
+from bisect import bisect_left
+from typing import Callable
+
+# Latency buckets (seconds) shared by the stage histograms
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _format_labels(names: tuple[str, ...], values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.label_names = labels
+
+    def header(self) -> list[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = ()):
+        super().__init__(name, help, labels)
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1, *labels):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> list[str]:
+        lines = self.header()
+        for labels, value in self._values.items():
+            lines.append(f"{self.name}{_format_labels(self.label_names, labels)} {_format_value(value)}")
+        return lines
+
+
+class Gauge(Metric):
+    """A value set directly, or read from ``func`` at scrape time."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, func: Callable[[], float] | None = None):
+        super().__init__(name, help)
+        self.func = func
+        self.value = 0.0
+
+    def set(self, value: float):
+        self.value = value
+
+    def inc(self, amount: float = 1):
+        self.value += amount
+
+    def dec(self, amount: float = 1):
+        self.value -= amount
+
+    def render(self) -> list[str]:
+        value = self.func() if self.func is not None else self.value
+        return self.header() + [f"{self.name} {_format_value(value)}"]
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labels: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets) + (math.inf,)
+        # Per label set: [per-bucket counts (non-cumulative), sum, count]
+        self._series: dict[tuple, list] = {}
+
+    def observe(self, value: float, *labels):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [[0] * len(self.buckets), 0.0, 0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def render(self) -> list[str]:
+        lines = self.header()
+        for labels, (counts, total, count) in self._series.items():
+            cumulative = 0
+            for bound, n in zip(self.buckets, counts):
+                cumulative += n
+                le = _format_labels(self.label_names, labels, f'le="{_format_value(bound)}"')
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            suffix = _format_labels(self.label_names, labels)
+            lines.append(f"{self.name}_sum{suffix} {_format_value(total)}")
+            lines.append(f"{self.name}_count{suffix} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """Process-local metrics rendered in the Prometheus text format.
+
+    With several uvicorn workers each process keeps its own values; a scrape
+    sees whichever worker answers.
+    """
+
+    def __init__(self):
+        self._metrics: list[Metric] = []
+
+    def register(self, metric: Metric) -> Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, help: str, labels: tuple[str, ...] = ()) -> Counter:
+        return self.register(Counter(name, help, labels))
+
+    def gauge(self, name: str, help: str, func: Callable[[], float] | None = None) -> Gauge:
+        return self.register(Gauge(name, help, func))
+
+    def histogram(self, name: str, help: str, labels: tuple[str, ...] = (), **kwargs) -> Histogram:
+        return self.register(Histogram(name, help, labels, **kwargs))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+
+stage_seconds = metrics.histogram(
+    "keyring_generation_stage_seconds",
+    "Time spent in each stage of a generation",
+    labels=("stage",),
+)
+generations_total = metrics.counter(
+    "keyring_generations_total", "Finished generations by outcome", labels=("status",)
+)
+sampler_steps_total = metrics.counter(
+    "keyring_sampler_steps_total", "KSampler steps timed (all but the first of each generation)"
+)
+sampler_seconds_total = metrics.counter(
+    "keyring_sampler_seconds_total", "Wall time spent between first and last sampler step"
+)
+sampler_steps_per_second = metrics.gauge(
+    "keyring_sampler_steps_per_second", "Sampler speed of the most recent generation"
+)
+tier_downgrades_total = metrics.counter(
+    "keyring_tier_downgrades_total",
+    "Jobs moved to a cheaper render tier because of the backlog",
+    labels=("requested", "tier"),
+)
+cancellations_total = metrics.counter(
+    "keyring_cancellations_total",
+    "Cancelled generations by where they were stopped",
+    labels=("stage",),
+)
+gpu_seconds_reclaimed_total = metrics.counter(
+    "keyring_gpu_seconds_reclaimed_total",
+    "Estimated ComfyUI render time saved by cancellations",
+)
+postprocess_seconds = metrics.histogram(
+    "keyring_postprocess_stage_seconds",
+    "Time spent in each image post-processing stage",
+    labels=("stage",),
+)
+postprocess_dropped_total = metrics.counter(
+    "keyring_postprocess_dropped_total",
+    "Images left without derivatives because the post-processing queue was full",
+)
+active_status_streams = metrics.gauge(
+    "keyring_status_streams_active", "Open /api/status event streams"
+)
+active_status_sockets = metrics.gauge(
+    "keyring_status_sockets_active", "Open /api/ws/status WebSocket connections"
+)
+
+
+class Timeline:
+    """Monotonic timestamps of one generation's milestones.
+
+    Each milestone closes the stage named after it in STAGES, measured from
+    the latest earlier milestone that was reached, so a missing event (say
+    a prompt that never reported progress) folds into the next stage.
+    """
+
+    # milestone -> stage it ends
+    STAGES = {
+        "submitted": None,
+        "dispatched": "queue_wait",
+        "comfyui_queued": "submit",
+        "execution_start": "comfyui_queue",
+        "first_step": "model_load",
+        "last_step": "sampling",
+        "executed": "decode",
+        "image_fetched": "image_fetch",
+        "persisted": "persist",
+    }
+
+    __slots__ = ("marks", "steps")
+
+    def __init__(self, submitted: float | None = None):
+        self.marks: dict[str, float] = {}
+        self.steps = 0
+        if submitted is not None:
+            self.marks["submitted"] = submitted
+
+    def mark(self, milestone: str):
+        self.marks.setdefault(milestone, time.monotonic())
+
+    def observe(self, status: str):
+        """Record this timeline's stage durations into the histograms."""
+        previous = None
+        for milestone, stage in self.STAGES.items():
+            at = self.marks.get(milestone)
+            if at is None:
+                continue
+            if previous is not None and stage is not None:
+                stage_seconds.observe(at - previous, stage)
+            previous = at
+        if "submitted" in self.marks and previous is not None:
+            stage_seconds.observe(previous - self.marks["submitted"], "total")
+
+        first, last = self.marks.get("first_step"), self.marks.get("last_step")
+        if self.steps > 1 and first is not None and last is not None and last > first:
+            sampling = last - first
+            # The first step's own duration is hidden in model_load
+            sampler_steps_total.inc(self.steps - 1)
+            sampler_seconds_total.inc(sampling)
+            sampler_steps_per_second.set((self.steps - 1) / sampling)
+        generations_total.inc(1, status)
@@ -0,0 +1,153 @@
+import io
+import os
+import time
+import asyncio
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Callable
+
+from app.config import settings
+from app.services.image_store import image_path, thumbnail_path
+from app.services.metrics import postprocess_dropped_total, postprocess_seconds
+
+try:
+    from PIL import Image
+except ImportError:  # stored PNGs are then served as ComfyUI wrote them
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+
+def _write_atomic(path: Path, data: bytes):
+    tmp = path.with_name(f".{path.name}.tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+
+
+def _encode(image, format: str, **params) -> bytes:
+    out = io.BytesIO()
+    image.save(out, format=format, **params)
+    return out.getvalue()
+
+
+def make_derivatives(source: str, thumbnail: str, thumbnail_size: int, webp_effort: int) -> dict[str, float]:
+    """Write the derivatives of one stored PNG; runs in a pool process.
+
+    The PNG itself is never rewritten: its URL was published as immutable
+    with a content ETag when the job completed. The WebP is lossless, since
+    it is served in place of the PNG at that URL, and only kept when it is
+    the smaller file. Returns seconds spent per stage.
+    """
+    path = Path(source)
+    timings = {}
+    with Image.open(path) as image:
+        image.load()
+
+        started = time.perf_counter()
+        small = image.convert("RGB")
+        small.thumbnail((thumbnail_size, thumbnail_size))
+        _write_atomic(Path(thumbnail), _encode(small, "JPEG", quality=80, optimize=True))
+        timings["thumbnail"] = time.perf_counter() - started
+
+        started = time.perf_counter()
+        # Served in place of the PNG to clients that accept it (images router)
+        webp = _encode(image, "WEBP", lossless=True, exact=True, quality=webp_effort, method=4)
+        if len(webp) < path.stat().st_size:
+            _write_atomic(path.with_suffix(".webp"), webp)
+        timings["webp"] = time.perf_counter() - started
+    return timings
+
+
+class PostProcessor:
+    """Derivative generation for stored images, off the event loop.
+
+    Jobs wait in a bounded queue and are handed to a process pool by
+    ``workers`` consumer tasks, so CPU-heavy encoding never runs on the API's
+    event loop nor holds its GIL. When the queue is full new images are
+    skipped rather than queued; the original PNG is always served.
+    """
+
+    def __init__(self, workers: int, max_queue: int):
+        self.workers = workers
+        self.max_queue = max_queue
+        self._queue: asyncio.Queue | None = None
+        self._executor: ProcessPoolExecutor | None = None
+        self._tasks: list[asyncio.Task] = []
+        self._handlers: list[Callable[[str, int], None]] = []
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def on_complete(self, handler: Callable[[str, int], None]):
+        """Call ``handler(generation_id, count)`` once a job's derivatives exist."""
+        self._handlers.append(handler)
+
+    def start(self):
+        if not settings.postprocess_enabled or self._executor is not None:
+            return
+        if Image is None:
+            logger.warning("Pillow is not installed; image post-processing is disabled")
+            return
+        self._queue = asyncio.Queue(self.max_queue)
+        # Spawned, not forked: the parent has an event loop and helper threads
+        self._executor = ProcessPoolExecutor(
+            self.workers, mp_context=multiprocessing.get_context("spawn")
+        )
+        self._tasks = [asyncio.create_task(self._consume()) for _ in range(self.workers)]
+
+    async def close(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        self._queue = None
+
+    def submit(self, generation_id: str, count: int) -> bool:
+        """Queue derivatives for a job's ``count`` stored images."""
+        if self._queue is None:
+            return False
+        try:
+            self._queue.put_nowait((generation_id, count, time.monotonic()))
+        except asyncio.QueueFull:
+            postprocess_dropped_total.inc()
+            logger.warning("Post-processing queue full, skipping %s", generation_id)
+            return False
+        return True
+
+    async def _consume(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            generation_id, count, queued_at = await self._queue.get()
+            started = time.monotonic()
+            postprocess_seconds.observe(started - queued_at, "queue_wait")
+            try:
+                for index in range(count):
+                    timings = await loop.run_in_executor(
+                        self._executor,
+                        make_derivatives,
+                        str(image_path(generation_id, index)),
+                        str(thumbnail_path(generation_id, index)),
+                        settings.thumbnail_size,
+                        settings.webp_effort,
+                    )
+                    for stage, seconds in timings.items():
+                        postprocess_seconds.observe(seconds, stage)
+            except Exception as e:
+                logger.error("Post-processing of %s failed: %s", generation_id, e)
+                continue
+            postprocess_seconds.observe(time.monotonic() - started, "total")
+            for handler in self._handlers:
+                # e.g. the job's record was evicted meanwhile; keep consuming
+                try:
+                    handler(generation_id, count)
+                except Exception:
+                    logger.exception("Post-processing handler failed for %s", generation_id)
+
+
+postprocessor = PostProcessor(settings.postprocess_workers, settings.postprocess_max_queue)
@@ -0,0 +1,101 @@
+import io
+import time
+import asyncio
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from app.config import settings
+
+try:
+    from PIL import Image
+except ImportError:  # previews are then passed through at ComfyUI's size
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class PreviewFrame:
+    seq: int
+    media_type: str
+    data: bytes
+
+
+def downscale(data: bytes, max_size: int) -> tuple[str, bytes]:
+    """Shrink a preview to fit max_size and re-encode it as JPEG."""
+    with Image.open(io.BytesIO(data)) as image:
+        image.thumbnail((max_size, max_size))
+        out = io.BytesIO()
+        image.convert("RGB").save(out, format="JPEG", quality=75)
+    return "image/jpeg", out.getvalue()
+
+
+class PreviewStore:
+    """Newest sampler preview per generation, one frame each.
+
+    ComfyUI sends a preview every step; frames arriving within ``interval``
+    of the last accepted one, or while that one is still being downscaled,
+    are dropped before any decoding. Entries are discarded when their job
+    finishes and capped at ``max_entries`` regardless.
+    """
+
+    def __init__(self, interval: float, max_size: int, max_entries: int):
+        self.interval = interval
+        self.max_size = max_size
+        self.max_entries = max_entries
+        self._frames: OrderedDict[str, PreviewFrame] = OrderedDict()
+        self._accepted_at: dict[str, float] = {}
+        self._busy: set[str] = set()
+        self.dropped = 0
+
+    def offer(self, generation_id: str) -> bool:
+        """Whether a frame arriving now should be processed."""
+        now = time.monotonic()
+        if generation_id in self._busy or now - self._accepted_at.get(generation_id, 0) < self.interval:
+            self.dropped += 1
+            return False
+        self._accepted_at[generation_id] = now
+        self._busy.add(generation_id)
+        return True
+
+    async def add(self, generation_id: str, media_type: str, data: bytes) -> PreviewFrame | None:
+        """Downscale an offered frame and make it the job's current preview."""
+        try:
+            if Image is not None:
+                media_type, data = await asyncio.to_thread(downscale, data, self.max_size)
+        except Exception as e:
+            logger.warning("Preview for %s could not be decoded: %s", generation_id, e)
+            return None
+        finally:
+            self._busy.discard(generation_id)
+        if generation_id not in self._accepted_at:
+            return None  # the job finished meanwhile
+        previous = self._frames.get(generation_id)
+        frame = PreviewFrame((previous.seq if previous else 0) + 1, media_type, data)
+        self.put(generation_id, frame)
+        return frame
+
+    def put(self, generation_id: str, frame: PreviewFrame):
+        self._frames[generation_id] = frame
+        self._frames.move_to_end(generation_id)
+        while len(self._frames) > self.max_entries:
+            evicted, _ = self._frames.popitem(last=False)
+            self._accepted_at.pop(evicted, None)
+
+    def get(self, generation_id: str) -> PreviewFrame | None:
+        return self._frames.get(generation_id)
+
+    def discard(self, generation_id: str):
+        self._frames.pop(generation_id, None)
+        self._accepted_at.pop(generation_id, None)
+
+    def __len__(self) -> int:
+        return len(self._frames)
+
+
+preview_store = PreviewStore(
+    settings.preview_interval,
+    settings.preview_max_size,
+    settings.preview_max_entries,
+)
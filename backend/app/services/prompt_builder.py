@@ -1,74 +1,24 @@
 import json
 import random
-import copy
+import hashlib
 import logging
 from pathlib import Path
 from app.models.schemas import GenerateRequest
+from app.services.catalog import catalog
+from app.services.render_tiers import RENDER_TIERS
 
 logger = logging.getLogger(__name__)
 
-BASE_ELEMENTS = {
-    "crystal": "crystalline translucent keyring charm, gemstone, faceted, refractive light",
-    "wood": "wooden carved keyring charm, natural grain texture, rustic handcrafted",
-    "metal": "polished metal keyring charm, chrome finish, reflective surface",
-    "plush": "soft plush keyring charm, fabric texture, cute stuffed toy style",
-    "glass": "blown glass keyring charm, delicate, iridescent, lampwork bead style",
-    "clay": "polymer clay keyring charm, handmade, smooth matte finish",
-    "resin": "epoxy resin keyring charm, clear with embedded elements, glossy dome",
-    "enchanted": "magical glowing keyring charm, ethereal, floating particles, fantasy artifact",
-}
-
-POTIONS = {
-    "potion_a": "sparkling, starry, cosmic dust",
-    "potion_b": "dark elegant, noir, mysterious shadows",
-    "potion_c": "natural, botanical, leaf and vine motifs",
-    "potion_d": "aquatic, water droplets, sea glass",
-    "potion_e": "fiery, warm gradient, ember glow",
-    "potion_f": "icy, snowflake patterns, frozen, winter",
-    "potion_g": "golden warm, amber, honeycomb texture",
-    "potion_h": "pastel, dreamy, soft focus, cotton candy",
-}
-
-SHAPES = {
-    "circle": "circular round shape",
-    "star": "five-pointed star shape",
-    "heart": "heart shape",
-    "hexagon": "hexagonal geometric shape",
-    "cloud": "soft cloud shape, puffy edges",
-    "diamond": "diamond rhombus shape, angular",
-}
-
-PATTERNS = {
-    "swirl": "swirling spiral pattern",
-    "dots": "polka dot pattern, scattered circles",
-    "stripes": "striped pattern, parallel lines",
-    "floral": "floral pattern, small flowers and petals",
-    "geometric": "geometric pattern, triangles and squares",
-    "plain": "smooth solid surface, no pattern",
-}
-
-COLORS = {
-    "ocean_blue": "ocean blue colored",
-    "sunset_pink": "sunset pink and coral colored",
-    "forest_green": "deep forest green colored",
-    "royal_purple": "rich royal purple colored",
-    "golden": "golden yellow colored",
-    "midnight": "dark midnight blue and black colored",
-    "rose": "soft rose pink colored",
-    "mint": "fresh mint green colored",
-}
-
 WORKFLOW_PATH = Path(__file__).parent.parent / "workflows" / "keyring_base.json"
 
 
 def build_prompt(choices: GenerateRequest) -> tuple[str, str]:
-    base = BASE_ELEMENTS.get(choices.base_element, "keyring charm")
-    potion_effects = ", ".join(
-        POTIONS[p] for p in choices.potions if p in POTIONS
-    )
-    shape = SHAPES.get(choices.shape, "round shape")
-    pattern = PATTERNS.get(choices.pattern, "smooth surface")
-    color = COLORS.get(choices.color, "colorful")
+    # GenerateRequest only admits ids present in the catalog
+    base = catalog.base_elements[choices.base_element].prompt
+    potion_effects = ", ".join(catalog.potions[p].prompt for p in choices.potions)
+    shape = catalog.shapes[choices.shape].prompt
+    pattern = catalog.patterns[choices.pattern].prompt
+    color = catalog.colors[choices.color].prompt
 
     parts = [
         "3D Render Style, 3DRenderAF",
@@ -92,103 +42,217 @@ def build_prompt(choices: GenerateRequest) -> tuple[str, str]:
     return positive, negative
 
 
-def build_workflow(choices: GenerateRequest) -> dict:
-    positive, negative = build_prompt(choices)
+# Built-in workflow used when keyring_base.json is missing, empty or invalid
+FALLBACK_WORKFLOW = {
+    "4": {
+        "class_type": "CheckpointLoaderSimple",
+        "inputs": {
+            "ckpt_name": "freedomRedmond_v1.safetensors"
+        },
+    },
+    "10": {
+        "class_type": "LoraLoader",
+        "inputs": {
+            "lora_name": "3DRedmond21V-3DRenderStyle-3DRenderAF.safetensors",
+            "strength_model": 0.8,
+            "strength_clip": 0.8,
+            "model": ["4", 0],
+            "clip": ["4", 1],
+        },
+    },
+    "6": {
+        "class_type": "CLIPTextEncode",
+        "inputs": {
+            "text": "",
+            "clip": ["10", 1],
+        },
+        "_meta": {"title": "CLIP Text Encode (Positive)"},
+    },
+    "7": {
+        "class_type": "CLIPTextEncode",
+        "inputs": {
+            "text": "",
+            "clip": ["10", 1],
+        },
+        "_meta": {"title": "CLIP Text Encode (Negative)"},
+    },
+    "5": {
+        "class_type": "EmptyLatentImage",
+        "inputs": {
+            "width": 768,
+            "height": 768,
+            "batch_size": 1,
+        },
+    },
+    "3": {
+        "class_type": "KSampler",
+        "inputs": {
+            "seed": 0,
+            "steps": 25,
+            "cfg": 7.0,
+            "sampler_name": "euler_ancestral",
+            "scheduler": "normal",
+            "denoise": 1.0,
+            "model": ["10", 0],
+            "positive": ["6", 0],
+            "negative": ["7", 0],
+            "latent_image": ["5", 0],
+        },
+    },
+    "8": {
+        "class_type": "VAEDecode",
+        "inputs": {
+            "samples": ["3", 0],
+            "vae": ["4", 2],
+        },
+    },
+    "9": {
+        "class_type": "SaveImage",
+        "inputs": {
+            "filename_prefix": "keyring",
+            "images": ["8", 0],
+        },
+    },
+}
+
+
+class WorkflowTemplate:
+    """Workflow JSON parsed and indexed once, reloaded when the file changes.
+
+    The node ids of the slots patched per request are resolved at load time,
+    so building a workflow is a shallow copy plus a few dict writes. Nodes
+    that are not patched are shared with the template and must not be mutated.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._mtime: float | None = None
+        self.nodes: dict = {}
+        self.positive_id = ""
+        self.negative_id = ""
+        self.sampler_id = ""
+        self.latent_id = ""
+
+    def refresh(self):
+        try:
+            mtime = self.path.stat().st_mtime
+        except FileNotFoundError:
+            mtime = None
+        if self.nodes and mtime == self._mtime:
+            return
+
+        nodes = None
+        if mtime is not None:
+            try:
+                with open(self.path) as f:
+                    nodes = json.load(f)
+                self._index(nodes)
+                logger.info("Workflow loaded from %s", self.path)
+            except (ValueError, KeyError, AttributeError, TypeError) as e:
+                logger.error("Invalid workflow %s, using built-in: %s", self.path, e)
+                nodes = None
+        if nodes is None:
+            nodes = FALLBACK_WORKFLOW
+            self._index(nodes)
+        self.nodes = nodes
+        self._mtime = mtime
 
-    workflow_loaded = False
-    if WORKFLOW_PATH.exists():
-        with open(WORKFLOW_PATH) as f:
-            workflow = json.load(f)
-        if workflow:  # guard against empty {}
-            workflow = copy.deepcopy(workflow)
-            # Inject prompts into workflow nodes
-            for node_id, node in workflow.items():
-                if node.get("class_type") == "CLIPTextEncode":
-                    title = node.get("_meta", {}).get("title", "").lower()
-                    if "positive" in title:
-                        node["inputs"]["text"] = positive
-                    elif "negative" in title:
-                        node["inputs"]["text"] = negative
-            # Set random seed
-            for node_id, node in workflow.items():
-                if node.get("class_type") == "KSampler":
-                    node["inputs"]["seed"] = random.randint(0, 2**32 - 1)
-            workflow_loaded = True
-            logger.info("Workflow loaded from %s", WORKFLOW_PATH)
-
-    if not workflow_loaded:
-        # Fallback: create a basic workflow programmatically
-        seed = random.randint(0, 2**32 - 1)
-        workflow = {
-            "4": {
-                "class_type": "CheckpointLoaderSimple",
-                "inputs": {
-                    "ckpt_name": "freedomRedmond_v1.safetensors"
-                },
-            },
-            "10": {
-                "class_type": "LoraLoader",
-                "inputs": {
-                    "lora_name": "3DRedmond21V-3DRenderStyle-3DRenderAF.safetensors",
-                    "strength_model": 0.8,
-                    "strength_clip": 0.8,
-                    "model": ["4", 0],
-                    "clip": ["4", 1],
-                },
-            },
-            "6": {
-                "class_type": "CLIPTextEncode",
-                "inputs": {
-                    "text": positive,
-                    "clip": ["10", 1],
-                },
-                "_meta": {"title": "CLIP Text Encode (Positive)"},
-            },
-            "7": {
-                "class_type": "CLIPTextEncode",
-                "inputs": {
-                    "text": negative,
-                    "clip": ["10", 1],
-                },
-                "_meta": {"title": "CLIP Text Encode (Negative)"},
-            },
-            "5": {
-                "class_type": "EmptyLatentImage",
-                "inputs": {
-                    "width": 768,
-                    "height": 768,
-                    "batch_size": 1,
-                },
-            },
-            "3": {
-                "class_type": "KSampler",
-                "inputs": {
-                    "seed": seed,
-                    "steps": 25,
-                    "cfg": 7.0,
-                    "sampler_name": "euler_ancestral",
-                    "scheduler": "normal",
-                    "denoise": 1.0,
-                    "model": ["10", 0],
-                    "positive": ["6", 0],
-                    "negative": ["7", 0],
-                    "latent_image": ["5", 0],
-                },
-            },
-            "8": {
-                "class_type": "VAEDecode",
-                "inputs": {
-                    "samples": ["3", 0],
-                    "vae": ["4", 2],
-                },
-            },
-            "9": {
-                "class_type": "SaveImage",
-                "inputs": {
-                    "filename_prefix": "keyring",
-                    "images": ["8", 0],
-                },
-            },
-        }
+    def _index(self, nodes: dict):
+        if not nodes:  # guard against empty {}
+            raise ValueError("workflow is empty")
+        positive_id = negative_id = sampler_id = latent_id = None
+        for node_id, node in nodes.items():
+            class_type = node.get("class_type")
+            if class_type == "CLIPTextEncode":
+                title = node.get("_meta", {}).get("title", "").lower()
+                if "positive" in title:
+                    positive_id = node_id
+                elif "negative" in title:
+                    negative_id = node_id
+            elif class_type == "KSampler":
+                sampler_id = node_id
+            elif class_type == "EmptyLatentImage":
+                latent_id = node_id
+        if None in (positive_id, negative_id, sampler_id, latent_id):
+            raise ValueError(
+                "workflow needs positive/negative CLIPTextEncode, KSampler "
+                "and EmptyLatentImage nodes"
+            )
+        self.positive_id = positive_id
+        self.negative_id = negative_id
+        self.sampler_id = sampler_id
+        self.latent_id = latent_id
 
+    def instantiate(
+        self, positive: str, negative: str, seed: int, batch_size: int = 1
+    ) -> dict:
+        self.refresh()
+        workflow = dict(self.nodes)
+        _patch(workflow, self.positive_id, text=positive)
+        _patch(workflow, self.negative_id, text=negative)
+        _patch(workflow, self.sampler_id, seed=seed)
+        if batch_size != 1:
+            _patch(workflow, self.latent_id, batch_size=batch_size)
+        return workflow
+
+
+def _patch(workflow: dict, node_id: str, **inputs):
+    """Replace a node with a copy whose inputs are updated."""
+    node = workflow[node_id]
+    workflow[node_id] = {**node, "inputs": {**node["inputs"], **inputs}}
+
+
+workflow_template = WorkflowTemplate(WORKFLOW_PATH)
+
+
+def workflow_affinity(workflow: dict) -> str:
+    """Key of the cacheable part of a workflow: everything upstream of the seed.
+
+    Two workflows with the same key differ only in the sampler and what
+    follows, so ComfyUI can reuse the loaders and both CLIP encodes.
+    """
+    template = workflow_template
+    parts = [
+        workflow[template.positive_id]["inputs"]["text"],
+        workflow[template.negative_id]["inputs"]["text"],
+    ]
+    return hashlib.sha1("\0".join(parts).encode()).hexdigest()
+
+
+def build_warmup_workflow(steps: int, size: int) -> dict:
+    """The real workflow shrunk to a few steps at a tiny size.
+
+    It loads the same checkpoint and LoRA as a user render, and shows its
+    result as a temporary preview instead of saving it to the output folder.
+    """
+    template = workflow_template
+    workflow = template.instantiate("keyring charm", "", seed=0)
+    _patch(workflow, template.sampler_id, steps=steps)
+    _patch(workflow, template.latent_id, width=size, height=size)
+    for node_id, node in workflow.items():
+        if node.get("class_type") == "SaveImage":
+            workflow[node_id] = {
+                "class_type": "PreviewImage",
+                "inputs": {"images": node["inputs"]["images"]},
+            }
+    return workflow
+
+
+def build_workflow(choices: GenerateRequest, tier: str | None = None) -> dict:
+    """Workflow for the request, rendered at ``tier`` (default: the requested one)."""
+    positive, negative = build_prompt(choices)
+    seed = choices.seed if choices.seed is not None else random.randint(0, 2**32 - 1)
+    template = workflow_template
+    workflow = template.instantiate(
+        positive, negative, seed, batch_size=choices.variants
+    )
+    render = RENDER_TIERS[tier or choices.tier]
+    _patch(
+        workflow,
+        template.sampler_id,
+        steps=render.steps,
+        sampler_name=render.sampler_name,
+        scheduler=render.scheduler,
+    )
+    _patch(workflow, template.latent_id, width=render.size, height=render.size)
     return workflow
@@ -0,0 +1,95 @@
+import json
+import time
+import hashlib
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from app.config import settings
+
+
+@dataclass
+class CacheEntry:
+    generation_id: str
+    done: bool = False
+    completed_at: float = 0.0
+
+
+class RenderCache:
+    """Content-addressed map from a canonical workflow hash to a generation.
+
+    An entry is registered when a render starts, so identical requests that
+    arrive while it is still running attach to the same generation instead of
+    queueing a duplicate. Finished entries are bounded by LRU size and TTL.
+    """
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: OrderedDict[str, CacheEntry] = OrderedDict()
+        self.hits = 0
+        self.coalesced = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def key_for(workflow: dict, include_seed: bool = False) -> str:
+        if not include_seed:
+            workflow = {
+                node_id: _without_seed(node) if node.get("class_type") == "KSampler" else node
+                for node_id, node in workflow.items()
+            }
+        canonical = json.dumps(workflow, sort_keys=True, separators=(",", ":"))
+        return hashlib.sha256(canonical.encode()).hexdigest()
+
+    def lookup(self, key: str) -> str | None:
+        """Return the generation that renders this key, or None on a miss."""
+        entry = self._entries.get(key)
+        if entry is not None and entry.done and time.monotonic() - entry.completed_at > self.ttl:
+            del self._entries[key]
+            self.evictions += 1
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        if entry.done:
+            self.hits += 1
+        else:
+            self.coalesced += 1
+        return entry.generation_id
+
+    def add(self, key: str, generation_id: str):
+        self._entries[key] = CacheEntry(generation_id)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def complete(self, key: str, generation_id: str):
+        entry = self._entries.get(key)
+        if entry is not None and entry.generation_id == generation_id:
+            entry.done = True
+            entry.completed_at = time.monotonic()
+
+    def discard(self, key: str, generation_id: str):
+        """Forget a failed render so the next request retries it."""
+        entry = self._entries.get(key)
+        if entry is not None and entry.generation_id == generation_id:
+            del self._entries[key]
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "coalesced": self.coalesced,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+def _without_seed(node: dict) -> dict:
+    inputs = {k: v for k, v in node["inputs"].items() if k != "seed"}
+    return {**node, "inputs": inputs}
+
+
+render_cache = RenderCache(settings.render_cache_max_entries, settings.render_cache_ttl)
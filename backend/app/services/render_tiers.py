@@ -0,0 +1,42 @@
+from dataclasses import dataclass
+
+from app.config import settings
+
+
+@dataclass(frozen=True)
+class RenderTier:
+    name: str
+    size: int
+    steps: int
+    sampler_name: str
+    scheduler: str
+
+
+# Cheapest first. "standard" is what the workflow template renders as shipped.
+RENDER_TIERS = {
+    tier.name: tier
+    for tier in (
+        RenderTier("preview", 512, 12, "dpmpp_2m", "karras"),
+        RenderTier("standard", 768, 25, "euler_ancestral", "normal"),
+        RenderTier("high", 768, 40, "dpmpp_2m", "karras"),
+    )
+}
+TIER_NAMES = tuple(RENDER_TIERS)
+
+
+def choose_tier(requested: str, queue_depth: int, estimated_wait: float) -> str:
+    """The tier a new job renders at under the current backlog.
+
+    Each configured threshold the backlog exceeds moves the job one tier
+    cheaper, and exceeding it twice over moves it two; a job is never moved
+    below "preview" or above what was requested.
+    """
+    steps_down = 0
+    for value, threshold in (
+        (queue_depth, settings.tier_degrade_queue_depth),
+        (estimated_wait, settings.tier_degrade_wait),
+    ):
+        if threshold > 0 and value >= threshold:
+            steps_down = max(steps_down, 2 if value >= 2 * threshold else 1)
+    index = max(0, TIER_NAMES.index(requested) - steps_down)
+    return TIER_NAMES[index]
@@ -0,0 +1,260 @@
+import time
+import asyncio
+import logging
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFullError(Exception):
+    """Raised when a job cannot be admitted; carries a Retry-After hint."""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+@dataclass
+class Job:
+    job_id: str
+    client_key: str
+    run: Callable[[], Awaitable[None]]
+    on_position: Callable[[int], None] | None = None
+    # Jobs with equal affinity share cacheable ComfyUI node inputs
+    affinity: str | None = None
+    position: int = 0
+    bypassed: int = 0
+    enqueued_at: float = field(default_factory=time.monotonic)
+
+
+class JobScheduler:
+    """Admission control and fair dispatch of renders to ComfyUI.
+
+    At most ``max_in_flight`` jobs run at once. Waiting jobs are queued per
+    client and dispatched round-robin across clients, so one user submitting
+    a burst cannot starve everyone else. Past ``max_queue_depth`` (or the
+    per-client limit) submissions are rejected with a Retry-After estimate.
+
+    With ``affinity_window`` > 0, a job whose affinity matches the last job
+    placed on the ComfyUI node the next dispatch will land on may be pulled
+    forward from the next ``affinity_window`` queued jobs, so that node can
+    reuse cached node outputs (checkpoint, LoRA, CLIP encodes). A job is
+    passed over at most ``affinity_max_bypass`` times.
+    """
+
+    def __init__(
+        self,
+        max_in_flight: int,
+        max_queue_depth: int,
+        max_per_client: int,
+        affinity_window: int = 0,
+        affinity_max_bypass: int = 3,
+    ):
+        self.max_in_flight = max_in_flight
+        self.max_queue_depth = max_queue_depth
+        self.max_per_client = max_per_client
+        self.affinity_window = affinity_window
+        self.affinity_max_bypass = affinity_max_bypass
+        # Affinity of the last job placed on each ComfyUI node
+        self._last_affinity: dict[str, str | None] = {}
+        self._next_node: Callable[[], str | None] = lambda: None
+        self.affinity_hits = 0
+        self._queues: OrderedDict[str, deque[Job]] = OrderedDict()
+        self._queued: dict[str, Job] = {}
+        self._depth = 0
+        self._running: dict[str, asyncio.Task] = {}
+        # Exponentially weighted average of end-to-end job time, for Retry-After
+        self.avg_job_seconds = 20.0
+
+    @property
+    def depth(self) -> int:
+        return self._depth
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._running)
+
+    def submit(
+        self,
+        job_id: str,
+        client_key: str,
+        run: Callable[[], Awaitable[None]],
+        on_position: Callable[[int], None] | None = None,
+        affinity: str | None = None,
+    ) -> int:
+        """Queue a job and return its 1-based queue position (0 if started)."""
+        queue = self._queues.get(client_key)
+        if self._depth >= self.max_queue_depth:
+            raise QueueFullError("Render queue is full", self.retry_after())
+        if queue is not None and len(queue) >= self.max_per_client:
+            raise QueueFullError("Too many pending renders", self.retry_after())
+
+        if queue is None:
+            queue = self._queues[client_key] = deque()
+        job = Job(job_id, client_key, run, on_position, affinity)
+        queue.append(job)
+        self._queued[job_id] = job
+        self._depth += 1
+        # A new client's job can be dispatched ahead of jobs already waiting
+        self._pump()
+        self._report_positions()
+        return job.position
+
+    def route_with(self, next_node: Callable[[], str | None]):
+        """Use ``next_node()`` to learn which node the next dispatch will land on."""
+        self._next_node = next_node
+
+    def record_affinity(self, node: str, affinity: str | None):
+        """Note that a job with ``affinity`` was placed on ``node``."""
+        self._last_affinity[node] = affinity
+
+    def position(self, job_id: str) -> int:
+        for position, job in enumerate(self._dispatch_order(), start=1):
+            if job.job_id == job_id:
+                return position
+        return 0
+
+    def owns(self, job_id: str) -> bool:
+        """Whether the job is queued or running in this process."""
+        return job_id in self._queued or job_id in self._running
+
+    def task(self, job_id: str) -> asyncio.Task | None:
+        return self._running.get(job_id)
+
+    def cancel(self, job_id: str) -> str | None:
+        """Withdraw a queued job or cancel a running one.
+
+        Returns "queued" or "running" for the state the job was in, or None
+        if this scheduler does not know it. A running job's task receives
+        CancelledError and is responsible for recording the outcome.
+        """
+        job = self._queued.pop(job_id, None)
+        if job is not None:
+            queue = self._queues[job.client_key]
+            queue.remove(job)
+            self._depth -= 1
+            if not queue:
+                del self._queues[job.client_key]
+            self._report_positions()
+            return "queued"
+        task = self._running.get(job_id)
+        if task is not None:
+            task.cancel()
+            return "running"
+        return None
+
+    def estimated_wait(self) -> float:
+        """Seconds a job submitted now would wait before dispatch."""
+        if self.in_flight < self.max_in_flight:
+            return 0.0
+        # The queue ahead in waves, plus about half a render for a slot to free up
+        return (self._depth / max(self.max_in_flight, 1) + 0.5) * self.avg_job_seconds
+
+    def retry_after(self) -> int:
+        waves = self._depth / max(self.max_in_flight, 1) + 1
+        return max(1, round(waves * self.avg_job_seconds))
+
+    def _dispatch_order(self):
+        """Yield queued jobs in the order they will be dispatched."""
+        iterators = [iter(q) for q in self._queues.values()]
+        while iterators:
+            alive = []
+            for it in iterators:
+                job = next(it, None)
+                if job is not None:
+                    yield job
+                    alive.append(it)
+            iterators = alive
+
+    def _pop_next(self) -> Job | None:
+        if not self._queues:
+            return None
+        job = self._pick_affine() or self._queues[next(iter(self._queues))][0]
+        queue = self._queues[job.client_key]
+        queue.remove(job)
+        del self._queued[job.job_id]
+        self._depth -= 1
+        # Rotate this client to the back so the next client goes first
+        del self._queues[job.client_key]
+        if queue:
+            self._queues[job.client_key] = queue
+        return job
+
+    def _pick_affine(self) -> Job | None:
+        """Find a job within the window that reuses the next node's cache."""
+        if self.affinity_window <= 0:
+            return None
+        last_affinity = self._last_affinity.get(self._next_node())
+        if last_affinity is None:
+            return None
+        ahead = []
+        for i, job in enumerate(self._dispatch_order()):
+            if i >= self.affinity_window or job.bypassed >= self.affinity_max_bypass:
+                # Fairness bound: this job has waited long enough, take it
+                return None
+            if job.affinity == last_affinity:
+                if ahead:
+                    for skipped in ahead:
+                        skipped.bypassed += 1
+                    self.affinity_hits += 1
+                return job
+            ahead.append(job)
+        return None
+
+    def _pump(self) -> bool:
+        started = False
+        while len(self._running) < self.max_in_flight:
+            job = self._pop_next()
+            if job is None:
+                break
+            job.position = 0
+            self._running[job.job_id] = asyncio.create_task(self._run(job))
+            started = True
+        return started
+
+    def _report_positions(self):
+        for position, job in enumerate(self._dispatch_order(), start=1):
+            if job.position != position:
+                job.position = position
+                if job.on_position is not None:
+                    job.on_position(position)
+
+    async def _run(self, job: Job):
+        started = time.monotonic()
+        cancelled = False
+        try:
+            await job.run()
+        except asyncio.CancelledError:
+            cancelled = True
+            raise
+        except Exception as e:
+            logger.error("Scheduled job %s failed: %s", job.job_id, e)
+        finally:
+            if not cancelled:
+                # A cancelled job's runtime says nothing about a typical render
+                elapsed = time.monotonic() - started
+                self.avg_job_seconds += 0.2 * (elapsed - self.avg_job_seconds)
+            self._running.pop(job.job_id, None)
+            if self._pump():
+                self._report_positions()
+
+    async def close(self):
+        for task in list(self._running.values()):
+            task.cancel()
+        await asyncio.gather(*self._running.values(), return_exceptions=True)
+        self._queues.clear()
+        self._queued.clear()
+        self._depth = 0
+
+
+scheduler = JobScheduler(
+    settings.scheduler_max_in_flight * len(settings.comfyui_urls),
+    settings.scheduler_max_queue_depth,
+    settings.scheduler_max_per_client,
+    settings.scheduler_affinity_window,
+    settings.scheduler_affinity_max_bypass,
+)
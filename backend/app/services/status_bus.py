@@ -0,0 +1,57 @@
+import asyncio
+from typing import Callable
+
+
+class StatusBus:
+    """In-process publish/subscribe channel keyed by generation id.
+
+    Subscribers hold an asyncio.Event that is set whenever the generation's
+    state changes; they re-read the store on wake-up, so bursts of updates
+    coalesce into one read and a slow consumer never builds up a backlog.
+    """
+
+    def __init__(self):
+        self._subscribers: dict[str, set[asyncio.Event]] = {}
+        self._idle_handlers: list[Callable[[str], None]] = []
+        self._active_handlers: list[Callable[[str], None]] = []
+
+    def on_active(self, handler: Callable[[str], None]):
+        """Call handler(generation_id) when a generation gains its first subscriber."""
+        self._active_handlers.append(handler)
+
+    def on_idle(self, handler: Callable[[str], None]):
+        """Call handler(generation_id) when a generation loses its last subscriber."""
+        self._idle_handlers.append(handler)
+
+    def subscribe(self, generation_id: str, waiter: asyncio.Event | None = None) -> asyncio.Event:
+        """Wake ``waiter`` (a new Event if omitted) on changes to this generation.
+
+        Passing the same Event for several ids lets one consumer watch them all.
+        """
+        waiter = waiter or asyncio.Event()
+        waiters = self._subscribers.setdefault(generation_id, set())
+        waiters.add(waiter)
+        if len(waiters) == 1:
+            for handler in self._active_handlers:
+                handler(generation_id)
+        return waiter
+
+    def unsubscribe(self, generation_id: str, waiter: asyncio.Event):
+        waiters = self._subscribers.get(generation_id)
+        if waiters is None:
+            return
+        waiters.discard(waiter)
+        if not waiters:
+            del self._subscribers[generation_id]
+            for handler in self._idle_handlers:
+                handler(generation_id)
+
+    def publish(self, generation_id: str):
+        for waiter in self._subscribers.get(generation_id, ()):
+            waiter.set()
+
+    def subscriber_count(self, generation_id: str) -> int:
+        return len(self._subscribers.get(generation_id, ()))
+
+
+status_bus = StatusBus()
@@ -0,0 +1,81 @@
+import math
+
+from app.services.comfyui_client import ComfyUIPool, comfyui_client
+from app.services.metrics import Timeline
+from app.services.render_tiers import RENDER_TIERS
+
+
+class WaitEstimator:
+    """Predicts how long until a job's image is ready.
+
+    Rolling averages are kept of the time per sampler step (fed by every
+    progress event) and of the overhead around sampling: submission and
+    model load before the first step, decode and image storage after the
+    last. Together with the ComfyUI queue depth polled from /queue, that
+    prices a job in any state. An estimate is a few arithmetic operations,
+    so it is recomputed for every status event.
+    """
+
+    def __init__(self, pool: ComfyUIPool, alpha: float = 0.2, step_alpha: float = 0.05):
+        self.pool = pool
+        self.alpha = alpha
+        self.step_alpha = step_alpha
+        self.step_seconds: float | None = None
+        self.pre_seconds = 0.0
+        self.post_seconds = 0.0
+        self.typical_steps = float(RENDER_TIERS["standard"].steps)
+
+    def observe_steps(self, steps: int, seconds: float):
+        """Record ``steps`` sampler steps that took ``seconds`` in total."""
+        if steps <= 0 or seconds <= 0:
+            return
+        per_step = seconds / steps
+        if self.step_seconds is None:
+            self.step_seconds = per_step
+        else:
+            self.step_seconds += self.step_alpha * (per_step - self.step_seconds)
+
+    def observe_job(self, timeline: Timeline):
+        """Record the overhead of a finished job from its timeline."""
+        marks = timeline.marks
+        if not all(m in marks for m in ("dispatched", "comfyui_queued", "first_step", "last_step", "persisted")):
+            return
+        # Waiting in ComfyUI's queue is priced separately from its depth
+        started = marks.get("execution_start", marks["comfyui_queued"])
+        pre = (marks["comfyui_queued"] - marks["dispatched"]) + (marks["first_step"] - started)
+        post = marks["persisted"] - marks["last_step"]
+        self.pre_seconds += self.alpha * (pre - self.pre_seconds)
+        self.post_seconds += self.alpha * (post - self.post_seconds)
+        if timeline.steps:
+            self.typical_steps += self.alpha * (timeline.steps - self.typical_steps)
+
+    def render_seconds(self, steps: float) -> float:
+        return self.pre_seconds + steps * self.step_seconds + self.post_seconds
+
+    def estimate(self, data: dict) -> float | None:
+        """Seconds until the job described by a job-store snapshot completes."""
+        if self.step_seconds is None:
+            return None  # nothing rendered yet
+        status = data.get("status")
+        tier = RENDER_TIERS.get(data.get("tier") or "standard", RENDER_TIERS["standard"])
+        total = data.get("total_steps") or tier.steps
+        step = data.get("step")
+        nodes = max(1, sum(1 for node in self.pool.nodes if node.accepting))
+        typical = self.render_seconds(self.typical_steps)
+
+        if status == "generating" and step:
+            seconds = (total - step) * self.step_seconds + self.post_seconds
+        elif status == "generating":
+            # Submitted; waiting in ComfyUI's queue or loading models
+            ahead = self.pool.prompts_ahead(data.get("prompt_id") or "") or 0
+            seconds = ahead * typical + self.render_seconds(total)
+        elif status == "queued":
+            # Our queue ahead of it drains after everything already in ComfyUI
+            ahead = (data.get("queue_position") or 1) - 1 + self.pool.queue_depth
+            seconds = math.ceil(ahead / nodes) * typical + self.render_seconds(total)
+        else:
+            return None
+        return round(max(seconds, 0.0), 1)
+
+
+wait_estimator = WaitEstimator(comfyui_client)
@@ -0,0 +1,104 @@
+import time
+import asyncio
+import logging
+
+from app.config import settings
+from app.services.broker import broker
+from app.services.comfyui_client import ComfyUINode, ComfyUIPool, comfyui_client
+from app.services.prompt_builder import build_warmup_workflow
+
+logger = logging.getLogger(__name__)
+
+
+class Warmup:
+    """Loads models on every ComfyUI node before it takes user renders.
+
+    Whenever a node's event stream connects (first start, or ComfyUI came
+    back after a restart and lost its loaded models), a warm-up render is
+    submitted to that node. The node counts as warm once it finishes; the
+    pool routes to warm nodes first and readiness waits for one.
+
+    Only the hub worker warms nodes, as only its scheduler submits renders;
+    other workers ask it for readiness.
+    """
+
+    def __init__(self, pool: ComfyUIPool):
+        self.pool = pool
+        self.last_error: dict[str, str] = {}
+        self.last_seconds: dict[str, float] = {}
+        # Node -> (event stream connection it was started on, warm-up task)
+        self._warming: dict[ComfyUINode, tuple[int, asyncio.Task]] = {}
+        self._task: asyncio.Task | None = None
+
+    def start(self):
+        if settings.warmup_enabled and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        tasks = [t for t in (self._task, *(task for _, task in self._warming.values())) if t is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._warming.clear()
+        self._task = None
+
+    async def _run(self):
+        while True:
+            if not broker.enabled or broker.role == "hub":
+                for node in self.pool.nodes:
+                    warming = self._warming.get(node)
+                    if warming is not None and warming[0] != node.events.connections:
+                        # The stream reconnected (ComfyUI restarted): that render is lost
+                        warming[1].cancel()
+                        del self._warming[node]
+                    if node.events.connected and not node.warm and node not in self._warming:
+                        connection = node.events.connections
+                        self._warming[node] = (connection, asyncio.create_task(self._warm(node, connection)))
+            await asyncio.sleep(min(1.0, settings.comfyui_health_interval))
+
+    async def _warm(self, node: ComfyUINode, connection: int):
+        started = time.monotonic()
+        logger.info("Warming up ComfyUI node %s", node.base_url)
+        try:
+            await asyncio.wait_for(self._render(node), timeout=settings.warmup_timeout)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.last_error[node.base_url] = str(e) or type(e).__name__
+            logger.warning("Warm-up of %s failed: %s", node.base_url, self.last_error[node.base_url])
+            # Back off before the run loop retries
+            await asyncio.sleep(settings.comfyui_health_interval)
+        else:
+            node.warmed_connection = connection
+            self.last_error.pop(node.base_url, None)
+            self.last_seconds[node.base_url] = time.monotonic() - started
+            logger.info(
+                "ComfyUI node %s warm after %.1fs", node.base_url, self.last_seconds[node.base_url]
+            )
+        finally:
+            if self._warming.get(node, (0, None))[1] is asyncio.current_task():
+                del self._warming[node]
+
+    async def _render(self, node: ComfyUINode):
+        workflow = build_warmup_workflow(settings.warmup_steps, settings.warmup_size)
+        prompt_id = await node.queue_prompt(workflow)
+        async for event in node.track_progress(prompt_id):
+            if event["status"] in ("error", "interrupted"):
+                raise RuntimeError(event.get("message", "warm-up render failed"))
+            if event["status"] == "complete":
+                return
+
+    def status(self) -> list[dict]:
+        return [
+            {
+                "url": node.base_url,
+                "warm": node.warm,
+                "warming": node in self._warming,
+                "seconds": self.last_seconds.get(node.base_url),
+                "error": self.last_error.get(node.base_url),
+            }
+            for node in self.pool.nodes
+        ]
+
+
+warmup = Warmup(comfyui_client)
@@ -0,0 +1,56 @@
+"""Microbenchmark: per-request workflow build time, before and after templating.
+
+Run from backend/:  python -m benchmarks.bench_build_workflow
+"""
+import copy
+import json
+import random
+import timeit
+
+from app.models.schemas import GenerateRequest
+from app.services.prompt_builder import WORKFLOW_PATH, build_prompt, build_workflow
+
+REQUEST = GenerateRequest(
+    base_element="crystal",
+    potions=["potion_a", "potion_d"],
+    shape="star",
+    pattern="swirl",
+    color="ocean_blue",
+)
+
+
+def legacy_build_workflow(choices: GenerateRequest) -> dict:
+    """The previous implementation: read, parse and deep-copy on every call."""
+    positive, negative = build_prompt(choices)
+    with open(WORKFLOW_PATH) as f:
+        workflow = json.load(f)
+    workflow = copy.deepcopy(workflow)
+    for node in workflow.values():
+        if node.get("class_type") == "CLIPTextEncode":
+            title = node.get("_meta", {}).get("title", "").lower()
+            if "positive" in title:
+                node["inputs"]["text"] = positive
+            elif "negative" in title:
+                node["inputs"]["text"] = negative
+    for node in workflow.values():
+        if node.get("class_type") == "KSampler":
+            node["inputs"]["seed"] = random.randint(0, 2**32 - 1)
+    return workflow
+
+
+def bench(fn, number: int = 20000) -> float:
+    fn(REQUEST)  # warm up (template load, page cache)
+    best = min(timeit.repeat(lambda: fn(REQUEST), number=number, repeat=5))
+    return best / number * 1e6
+
+
+def main():
+    before = bench(legacy_build_workflow)
+    after = bench(build_workflow)
+    print(f"legacy   build_workflow: {before:8.2f} us/request")
+    print(f"template build_workflow: {after:8.2f} us/request")
+    print(f"speedup: {before / after:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""Memory benchmark: 100k completed jobs in the generation store.
+
+Compares the previous dict-of-dicts store with JobRecord slots, and shows
+the bounded footprint once TTL/LRU eviction is in effect.
+
+Run from backend/:  python -m benchmarks.bench_job_store_memory
+"""
+import tracemalloc
+import uuid
+
+from app.services.job_store import JobRecord, JobStore, MemoryJobStore
+
+JOBS = 100_000
+
+
+def completed_fields(generation_id: str) -> dict:
+    return {
+        "status": "complete",
+        "progress": 1.0,
+        "step": 25,
+        "total_steps": 25,
+        "prompt_id": str(uuid.uuid4()),
+        "images": [{"filename": "keyring_00001_.png", "subfolder": ""}],
+        "image_url": f"/api/images/{generation_id}",
+        "image_urls": [f"/api/images/{generation_id}"],
+    }
+
+
+def measure(fill) -> tuple[int, float]:
+    ids = [str(uuid.uuid4()) for _ in range(JOBS)]
+    tracemalloc.start()
+    store = fill(ids)
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return len(store) if hasattr(store, "__len__") else len(store.memory), current / 2**20
+
+
+def fill_dicts(ids):
+    store = {}
+    for job_id in ids:
+        store[job_id] = {"status": "queued", "progress": 0}
+        store[job_id].update(completed_fields(job_id))
+    return store
+
+
+def fill_records(max_entries):
+    def fill(ids):
+        store = JobStore(MemoryJobStore(max_entries, ttl=3600))
+        for job_id in ids:
+            store.create(job_id)
+            store.update(job_id, **completed_fields(job_id))
+        return store
+    return fill
+
+
+def main():
+    rows = [
+        ("dict of dicts (previous)", measure(fill_dicts)),
+        ("JobRecord, unbounded", measure(fill_records(JOBS))),
+        ("JobRecord, max_entries=10000", measure(fill_records(10_000))),
+    ]
+    print(f"{JOBS} completed jobs (JobRecord slots: {len(JobRecord.__slots__)})")
+    for name, (resident, mib) in rows:
+        print(f"{name:32s} {resident:7d} resident  {mib:8.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()
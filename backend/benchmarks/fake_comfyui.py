@@ -0,0 +1,355 @@
+"""Stand-in ComfyUI server for load tests and local development without a GPU.
+
+Implements the parts of the ComfyUI API the backend uses: POST /prompt,
+/ws (status, execution_start, execution_cached, executing, progress,
+binary preview frames, executed, execution_success / execution_error),
+/view, /history/{prompt_id}, /queue (GET and delete), /interrupt and
+/system_stats. Prompts run one at a time per simulated GPU, one sampler
+step every --step-latency seconds, and output real (solid colour) PNGs.
+
+Failure injection: --reject-rate answers /prompt with HTTP 500,
+--fail-rate aborts a render half-way with execution_error, and
+--ws-drop-rate closes the client's WebSocket mid-render.
+
+For event lag measurements, GET /fake/timeline/{seed} returns the wall
+clock time each step of the render with that KSampler seed was sent.
+
+Run from backend/:  python -m benchmarks.fake_comfyui --port 8890
+"""
+import argparse
+import asyncio
+import json
+import random
+import struct
+import time
+import uuid
+import zlib
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from pathlib import Path
+
+import uvicorn
+from fastapi import FastAPI, HTTPException, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import Response
+
+# ComfyUI binary WebSocket frame header: event type, then image format
+PREVIEW_IMAGE = 1
+PREVIEW_PNG = 2
+
+MAX_HISTORY = 4096
+
+# Nodes that run after the sampler; the output ones report images
+OUTPUT_NODES = ("SaveImage", "PreviewImage")
+LATE_NODES = ("VAEDecode", *OUTPUT_NODES)
+
+
+def solid_png(width: int, height: int, rgb: tuple[int, int, int]) -> bytes:
+    def chunk(tag: bytes, data: bytes) -> bytes:
+        body = tag + data
+        return struct.pack(">I", len(data)) + body + struct.pack(">I", zlib.crc32(body))
+
+    row = b"\x00" + bytes(rgb) * width
+    header = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + chunk(b"IHDR", header)
+        + chunk(b"IDAT", zlib.compress(row * height, 6))
+        + chunk(b"IEND", b"")
+    )
+
+
+class FakeComfyUI:
+    def __init__(self, args: argparse.Namespace):
+        self.args = args
+        self.rng = random.Random(args.random_seed)
+        self.clients: dict[str, WebSocket] = {}
+        self.pending: OrderedDict[str, dict] = OrderedDict()
+        self.running: dict[str, dict] = {}
+        self.history: OrderedDict[str, dict] = OrderedDict()
+        self.timelines: OrderedDict[int, dict] = OrderedDict()
+        self.images: OrderedDict[str, bytes] = OrderedDict()
+        self.interrupted: set[str] = set()
+        self.last_inputs: dict[str, str] = {}
+        self.number = 0
+        self.work = asyncio.Queue()
+        self.output_dir = Path(args.output_dir) if args.output_dir else None
+
+    def start(self):
+        if self.output_dir is not None:
+            self.output_dir.mkdir(parents=True, exist_ok=True)
+        for _ in range(self.args.parallel):
+            asyncio.create_task(self.worker())
+
+    async def send(self, client_id: str, message: dict):
+        ws = self.clients.get(client_id)
+        if ws is None:
+            return
+        try:
+            await ws.send_text(json.dumps(message))
+        except Exception:
+            self.clients.pop(client_id, None)
+
+    async def send_bytes(self, client_id: str, data: bytes):
+        ws = self.clients.get(client_id)
+        if ws is None:
+            return
+        try:
+            await ws.send_bytes(data)
+        except Exception:
+            self.clients.pop(client_id, None)
+
+    async def broadcast_status(self):
+        remaining = len(self.pending) + len(self.running)
+        message = {"type": "status", "data": {"status": {"exec_info": {"queue_remaining": remaining}}}}
+        for client_id in list(self.clients):
+            await self.send(client_id, message)
+
+    def submit(self, body: dict) -> dict:
+        if self.rng.random() < self.args.reject_rate:
+            raise HTTPException(status_code=500, detail="injected failure")
+        workflow = body.get("prompt")
+        if not isinstance(workflow, dict) or not workflow:
+            raise HTTPException(status_code=400, detail="invalid prompt")
+        prompt_id = str(uuid.uuid4())
+        self.number += 1
+        self.pending[prompt_id] = {
+            "number": self.number,
+            "prompt_id": prompt_id,
+            "workflow": workflow,
+            "client_id": body.get("client_id", ""),
+        }
+        self.work.put_nowait(prompt_id)
+        return {"prompt_id": prompt_id, "number": self.number, "node_errors": {}}
+
+    async def worker(self):
+        while True:
+            prompt_id = await self.work.get()
+            job = self.pending.pop(prompt_id, None)
+            if job is None:  # deleted from the queue while pending
+                continue
+            self.running[prompt_id] = job
+            try:
+                await self.execute(job)
+            finally:
+                self.running.pop(prompt_id, None)
+                self.interrupted.discard(prompt_id)
+                await self.broadcast_status()
+
+    async def execute(self, job: dict):
+        prompt_id = job["prompt_id"]
+        client_id = job["client_id"]
+        workflow = job["workflow"]
+        nodes = {node_id: node for node_id, node in workflow.items() if isinstance(node, dict)}
+        sampler = next((n for n in nodes.values() if n.get("class_type") == "KSampler"), {})
+        latent = next((n for n in nodes.values() if n.get("class_type") == "EmptyLatentImage"), {})
+        sampler_inputs = sampler.get("inputs", {})
+        latent_inputs = latent.get("inputs", {})
+        seed = int(sampler_inputs.get("seed", 0))
+        steps = self.args.steps or int(sampler_inputs.get("steps", 20))
+        batch_size = int(latent_inputs.get("batch_size", 1))
+        width = int(latent_inputs.get("width", 512))
+        height = int(latent_inputs.get("height", 512))
+        timeline = self.timelines[seed] = {"prompt_id": prompt_id, "steps": {}}
+        while len(self.timelines) > MAX_HISTORY:
+            self.timelines.popitem(last=False)
+
+        await self.send(client_id, {"type": "execution_start", "data": {"prompt_id": prompt_id, "timestamp": int(time.time() * 1000)}})
+
+        # Nodes before the sampler whose inputs match the previous run are cached
+        cached = []
+        for node_id, node in nodes.items():
+            if node.get("class_type") in ("KSampler", *LATE_NODES):
+                continue
+            key = json.dumps(node.get("inputs", {}), sort_keys=True)
+            if self.last_inputs.get(node_id) == key:
+                cached.append(node_id)
+            self.last_inputs[node_id] = key
+        if cached:
+            await self.send(client_id, {"type": "execution_cached", "data": {"nodes": cached, "prompt_id": prompt_id}})
+        for node_id, node in nodes.items():
+            if node_id in cached or node.get("class_type") in ("KSampler", *LATE_NODES):
+                continue
+            await self.send(client_id, {"type": "executing", "data": {"node": node_id, "prompt_id": prompt_id}})
+            await asyncio.sleep(self.args.node_latency)
+
+        sampler_id = next((i for i, n in nodes.items() if n is sampler), None)
+        await self.send(client_id, {"type": "executing", "data": {"node": sampler_id, "prompt_id": prompt_id}})
+        fail_at = steps // 2 + 1 if self.rng.random() < self.args.fail_rate else None
+        drop_at = self.rng.randint(1, steps) if self.rng.random() < self.args.ws_drop_rate else None
+        rgb = (seed & 0xFF, (seed >> 8) & 0xFF, (seed >> 16) & 0xFF)
+        preview = struct.pack(">II", PREVIEW_IMAGE, PREVIEW_PNG) + solid_png(width // 8, height // 8, rgb)
+
+        for step in range(1, steps + 1):
+            await asyncio.sleep(self.args.step_latency)
+            if prompt_id in self.interrupted:
+                await self.send(client_id, {"type": "execution_interrupted", "data": {"prompt_id": prompt_id, "node_id": sampler_id}})
+                self.record(prompt_id, job, {}, "error")
+                return
+            if step == fail_at:
+                await self.send(client_id, {"type": "execution_error", "data": {
+                    "prompt_id": prompt_id,
+                    "node_id": sampler_id,
+                    "exception_type": "RuntimeError",
+                    "exception_message": "injected failure",
+                }})
+                self.record(prompt_id, job, {}, "error")
+                return
+            timeline["steps"][step] = time.time()
+            await self.send(client_id, {"type": "progress", "data": {"value": step, "max": steps, "prompt_id": prompt_id, "node": sampler_id}})
+            if self.args.previews:
+                await self.send_bytes(client_id, preview)
+            if step == drop_at and client_id in self.clients:
+                await self.clients.pop(client_id).close()
+
+        for node_id, node in nodes.items():
+            if node.get("class_type") in LATE_NODES:
+                await self.send(client_id, {"type": "executing", "data": {"node": node_id, "prompt_id": prompt_id}})
+                await asyncio.sleep(self.args.node_latency)
+
+        save_id = next((i for i, n in nodes.items() if n.get("class_type") in OUTPUT_NODES), "9")
+        save = nodes.get(save_id, {})
+        # PreviewImage writes to ComfyUI's temp folder, not the output one
+        kind = "temp" if save.get("class_type") == "PreviewImage" else "output"
+        prefix = save.get("inputs", {}).get("filename_prefix", "ComfyUI")
+        png = solid_png(width, height, rgb)
+        images = []
+        for _ in range(batch_size):
+            filename = f"{prefix}_{uuid.uuid4().hex[:12]}_.png"
+            self.images[filename] = png
+            if self.output_dir is not None and kind == "output":
+                (self.output_dir / filename).write_bytes(png)
+            images.append({"filename": filename, "subfolder": "", "type": kind})
+        while len(self.images) > MAX_HISTORY:
+            self.images.popitem(last=False)
+        output = {"images": images}
+        await self.send(client_id, {"type": "executed", "data": {"node": save_id, "output": output, "prompt_id": prompt_id}})
+        timeline["done"] = time.time()
+        self.record(prompt_id, job, {save_id: output}, "success")
+        await self.send(client_id, {"type": "executing", "data": {"node": None, "prompt_id": prompt_id}})
+        await self.send(client_id, {"type": "execution_success", "data": {"prompt_id": prompt_id}})
+
+    def record(self, prompt_id: str, job: dict, outputs: dict, status: str):
+        self.history[prompt_id] = {
+            "prompt": [job["number"], prompt_id, job["workflow"], {"client_id": job["client_id"]}, []],
+            "outputs": outputs,
+            "status": {"status_str": status, "completed": status == "success", "messages": []},
+        }
+        while len(self.history) > MAX_HISTORY:
+            self.history.popitem(last=False)
+
+    def queue_entries(self, jobs) -> list:
+        return [[j["number"], j["prompt_id"], j["workflow"], {"client_id": j["client_id"]}, []] for j in jobs]
+
+
+def create_app(args: argparse.Namespace) -> FastAPI:
+    fake = FakeComfyUI(args)
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        fake.start()
+        yield
+
+    app = FastAPI(lifespan=lifespan)
+    app.state.fake = fake
+
+    @app.post("/prompt")
+    async def prompt(request: Request):
+        result = fake.submit(await request.json())
+        await fake.broadcast_status()
+        return result
+
+    @app.websocket("/ws")
+    async def ws(websocket: WebSocket):
+        await websocket.accept()
+        client_id = websocket.query_params.get("clientId") or uuid.uuid4().hex
+        fake.clients[client_id] = websocket
+        remaining = len(fake.pending) + len(fake.running)
+        await websocket.send_text(json.dumps({"type": "status", "data": {
+            "status": {"exec_info": {"queue_remaining": remaining}}, "sid": client_id,
+        }}))
+        try:
+            while True:
+                await websocket.receive_text()
+        except WebSocketDisconnect:
+            pass
+        finally:
+            if fake.clients.get(client_id) is websocket:
+                del fake.clients[client_id]
+
+    @app.get("/view")
+    async def view(filename: str, subfolder: str = "", type: str = "output"):
+        data = fake.images.get(filename)
+        if data is None:
+            raise HTTPException(status_code=404)
+        return Response(data, media_type="image/png")
+
+    @app.get("/history/{prompt_id}")
+    async def history(prompt_id: str):
+        entry = fake.history.get(prompt_id)
+        return {prompt_id: entry} if entry is not None else {}
+
+    @app.get("/queue")
+    async def queue():
+        return {
+            "queue_running": fake.queue_entries(fake.running.values()),
+            "queue_pending": fake.queue_entries(fake.pending.values()),
+        }
+
+    @app.post("/queue")
+    async def queue_edit(request: Request):
+        body = await request.json()
+        if body.get("clear"):
+            fake.pending.clear()
+        for prompt_id in body.get("delete", []):
+            fake.pending.pop(prompt_id, None)
+        await fake.broadcast_status()
+        return {}
+
+    @app.post("/interrupt")
+    async def interrupt(request: Request):
+        body = await request.body()
+        prompt_id = json.loads(body).get("prompt_id") if body else None
+        fake.interrupted.update([prompt_id] if prompt_id else fake.running)
+        return {}
+
+    @app.get("/system_stats")
+    async def system_stats():
+        return {
+            "system": {"os": "fake", "python_version": "", "comfyui_version": "fake"},
+            "devices": [{"name": "fake:0", "type": "cuda", "index": 0, "vram_total": 24 << 30, "vram_free": 20 << 30}],
+        }
+
+    @app.get("/fake/timeline/{seed}")
+    async def timeline(seed: int):
+        entry = fake.timelines.get(seed)
+        if entry is None:
+            raise HTTPException(status_code=404)
+        return entry
+
+    return app
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8890)
+    parser.add_argument("--steps", type=int, default=0, help="override KSampler steps (0 = use workflow)")
+    parser.add_argument("--step-latency", type=float, default=0.05, help="seconds per sampler step")
+    parser.add_argument("--node-latency", type=float, default=0.005, help="seconds per non-sampler node")
+    parser.add_argument("--parallel", type=int, default=1, help="prompts executed concurrently")
+    parser.add_argument("--no-previews", dest="previews", action="store_false")
+    parser.add_argument("--reject-rate", type=float, default=0.0)
+    parser.add_argument("--fail-rate", type=float, default=0.0)
+    parser.add_argument("--ws-drop-rate", type=float, default=0.0)
+    parser.add_argument("--output-dir", default="", help="also write outputs here (shared volume)")
+    parser.add_argument("--random-seed", type=int, default=None)
+    return parser.parse_args(argv)
+
+
+def main():
+    args = parse_args()
+    uvicorn.run(create_app(args), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,398 @@
+"""End-to-end load test: /api/generate -> /api/status SSE -> /api/images.
+
+Each virtual user submits a generation, follows its status stream to the
+end and downloads the image, --iterations times. Reports p50/p95/p99 per
+stage, the lag between the fake ComfyUI sending a progress step and the
+SSE event reaching the client, and the backend's RSS and CPU use.
+
+With --spawn, a fake ComfyUI (benchmarks.fake_comfyui) and the backend are
+started as subprocesses on free ports, so one command runs the whole thing:
+
+    python -m benchmarks.load_test --spawn --users 200 --steps 10
+
+Against running servers, pass --base-url, --fake-url (for event lag) and
+--backend-pid (for RSS/CPU). --max-p95 and --max-error-rate make the run
+exit non-zero when exceeded, for CI; --json writes the full report.
+
+Run from backend/.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from pathlib import Path
+
+import httpx
+
+STAGES = ("submit", "queued", "render", "sse_total", "image", "total")
+
+
+def percentile(values: list[float], p: float) -> float:
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    k = max(0, min(len(ordered) - 1, round(p / 100 * len(ordered) + 0.5) - 1))
+    return ordered[k]
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class ProcessSampler:
+    """Samples RSS and CPU time of a process and its children from /proc."""
+
+    def __init__(self, pid: int, interval: float = 0.5):
+        self.pid = pid
+        self.interval = interval
+        self.tick = os.sysconf("SC_CLK_TCK")
+        self.page = os.sysconf("SC_PAGE_SIZE")
+        self.peak_rss = 0
+        self.rss_samples: list[int] = []
+        self.cpu_start = self.wall_start = None
+        self.cpu_end = self.wall_end = None
+
+    def _pids(self, pid: int) -> list[int]:
+        pids = [pid]
+        try:
+            children = Path(f"/proc/{pid}/task/{pid}/children").read_text().split()
+        except OSError:
+            return pids
+        for child in children:
+            pids.extend(self._pids(int(child)))
+        return pids
+
+    def _read(self) -> tuple[int, float]:
+        rss = cpu = 0
+        for pid in self._pids(self.pid):
+            try:
+                stat = Path(f"/proc/{pid}/stat").read_text()
+                statm = Path(f"/proc/{pid}/statm").read_text()
+            except OSError:
+                continue
+            fields = stat.rsplit(")", 1)[1].split()
+            cpu += (int(fields[11]) + int(fields[12])) / self.tick
+            rss += int(statm.split()[1]) * self.page
+        return rss, cpu
+
+    async def run(self):
+        _, self.cpu_start = self._read()
+        self.wall_start = time.monotonic()
+        while True:
+            rss, self.cpu_end = self._read()
+            self.wall_end = time.monotonic()
+            self.rss_samples.append(rss)
+            self.peak_rss = max(self.peak_rss, rss)
+            await asyncio.sleep(self.interval)
+
+    def report(self) -> dict:
+        wall = (self.wall_end or 0) - (self.wall_start or 0)
+        cpu = (self.cpu_end or 0) - (self.cpu_start or 0)
+        return {
+            "peak_rss_mb": self.peak_rss / 2**20,
+            "mean_rss_mb": sum(self.rss_samples) / max(1, len(self.rss_samples)) / 2**20,
+            "cpu_seconds": cpu,
+            "cpu_percent": 100 * cpu / wall if wall > 0 else 0.0,
+        }
+
+
+class LoadTest:
+    def __init__(self, args: argparse.Namespace):
+        self.args = args
+        self.stages: dict[str, list[float]] = defaultdict(list)
+        self.event_lag: list[float] = []
+        self.outcomes: dict[str, int] = defaultdict(int)
+        self.choices: dict = {}
+        self.client: httpx.AsyncClient | None = None
+        self.fake: httpx.AsyncClient | None = None
+
+    def random_request(self, rng: random.Random, base_element: str) -> dict:
+        c = self.choices
+        return {
+            "base_element": base_element,
+            "potions": [p["id"] for p in rng.sample(c["potions"], k=min(2, len(c["potions"])))],
+            "shape": rng.choice(c["shapes"]),
+            "pattern": rng.choice(c["patterns"]),
+            "color": rng.choice(c["colors"])["id"],
+            "seed": rng.randrange(2**32),
+        }
+
+    async def user(self, index: int):
+        rng = random.Random(index)
+        # Distinct X-Real-IP per user so the scheduler sees separate clients
+        headers = {"X-Real-IP": f"10.{index >> 16 & 255}.{index >> 8 & 255}.{index & 255}"}
+        await asyncio.sleep(self.args.ramp * index / max(1, self.args.users))
+        for _ in range(self.args.iterations):
+            await self.generation(rng, headers)
+
+    async def generation(self, rng: random.Random, headers: dict):
+        # Same flow as the frontend: spin for a base element, then generate
+        try:
+            spin = await self.client.post("/api/gacha/spin", headers=headers)
+        except httpx.HTTPError:
+            self.outcomes["submit_error"] += 1
+            return
+        body = self.random_request(rng, spin.json()["base_element"])
+        started = time.monotonic()
+        try:
+            response = await self.client.post("/api/generate", json=body, headers=headers)
+        except httpx.HTTPError:
+            self.outcomes["submit_error"] += 1
+            return
+        submitted = time.monotonic()
+        if response.status_code == 429:
+            self.outcomes["rejected"] += 1
+            await asyncio.sleep(float(response.headers.get("retry-after", 1)))
+            return
+        if response.status_code != 200:
+            self.outcomes[f"http_{response.status_code}"] += 1
+            return
+        self.stages["submit"].append(submitted - started)
+        generation_id = response.json()["generation_id"]
+
+        first_generating = final = None
+        step_times: dict[int, float] = {}
+        try:
+            async with self.client.stream("GET", f"/api/status/{generation_id}") as stream:
+                async for line in stream.aiter_lines():
+                    if not line.startswith("data: "):
+                        continue
+                    event = json.loads(line[6:])
+                    now = time.monotonic()
+                    if event["status"] == "generating" and first_generating is None:
+                        first_generating = now
+                    if event.get("step"):
+                        step_times.setdefault(event["step"], time.time())
+                    if event["status"] in ("complete", "error"):
+                        final = event
+                        break
+        except httpx.HTTPError:
+            self.outcomes["stream_error"] += 1
+            return
+        done = time.monotonic()
+        if final is None or final["status"] != "complete":
+            self.outcomes["render_error"] += 1
+            return
+
+        self.stages["queued"].append((first_generating or done) - submitted)
+        self.stages["render"].append(done - (first_generating or done))
+        self.stages["sse_total"].append(done - submitted)
+        if self.fake is not None:
+            await self.measure_lag(body["seed"], step_times)
+
+        image_started = time.monotonic()
+        try:
+            image = await self.client.get(final["image_url"])
+        except httpx.HTTPError:
+            self.outcomes["image_error"] += 1
+            return
+        finished = time.monotonic()
+        if image.status_code != 200:
+            self.outcomes["image_error"] += 1
+            return
+        self.stages["image"].append(finished - image_started)
+        self.stages["total"].append(finished - started)
+        self.outcomes["complete"] += 1
+
+    async def measure_lag(self, seed: int, step_times: dict[int, float]):
+        try:
+            response = await self.fake.get(f"/fake/timeline/{seed}")
+        except httpx.HTTPError:
+            return
+        if response.status_code != 200:
+            return
+        sent = response.json()["steps"]
+        for step, received in step_times.items():
+            if str(step) in sent:
+                self.event_lag.append(received - sent[str(step)])
+
+    async def run(self, backend_pid: int | None) -> dict:
+        limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+        timeout = httpx.Timeout(self.args.timeout, connect=10.0)
+        async with httpx.AsyncClient(base_url=self.args.base_url, limits=limits, timeout=timeout) as client:
+            self.client = client
+            if self.args.fake_url:
+                self.fake = httpx.AsyncClient(base_url=self.args.fake_url, limits=limits, timeout=timeout)
+            self.choices = (await client.get("/api/choices")).json()
+
+            sampler = ProcessSampler(backend_pid) if backend_pid else None
+            sampler_task = asyncio.create_task(sampler.run()) if sampler else None
+            started = time.monotonic()
+            await asyncio.gather(*(self.user(i) for i in range(self.args.users)))
+            elapsed = time.monotonic() - started
+            if sampler_task is not None:
+                sampler_task.cancel()
+            if self.fake is not None:
+                await self.fake.aclose()
+
+        attempts = sum(self.outcomes.values())
+        failures = attempts - self.outcomes["complete"] - self.outcomes["rejected"]
+        return {
+            "users": self.args.users,
+            "iterations": self.args.iterations,
+            "elapsed_seconds": elapsed,
+            "throughput_per_second": self.outcomes["complete"] / elapsed if elapsed else 0.0,
+            "outcomes": dict(self.outcomes),
+            "error_rate": failures / attempts if attempts else 0.0,
+            "stages": {name: summarize(self.stages[name]) for name in STAGES},
+            "event_lag": summarize(self.event_lag),
+            "backend": sampler.report() if sampler else None,
+        }
+
+
+def summarize(values: list[float]) -> dict:
+    return {
+        "count": len(values),
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "p99": percentile(values, 99),
+        "max": max(values) if values else float("nan"),
+    }
+
+
+def print_report(report: dict):
+    print(
+        f"{report['users']} users x {report['iterations']} in {report['elapsed_seconds']:.1f}s "
+        f"({report['throughput_per_second']:.2f} renders/s), outcomes {report['outcomes']}"
+    )
+    print(f"{'stage (ms)':12s} {'n':>6s} {'p50':>9s} {'p95':>9s} {'p99':>9s} {'max':>9s}")
+    rows = list(report["stages"].items()) + [("event_lag", report["event_lag"])]
+    for name, s in rows:
+        print(
+            f"{name:12s} {s['count']:6d} {s['p50'] * 1000:9.1f} {s['p95'] * 1000:9.1f} "
+            f"{s['p99'] * 1000:9.1f} {s['max'] * 1000:9.1f}"
+        )
+    if report["backend"]:
+        b = report["backend"]
+        print(
+            f"backend: peak RSS {b['peak_rss_mb']:.1f} MiB, mean RSS {b['mean_rss_mb']:.1f} MiB, "
+            f"CPU {b['cpu_seconds']:.2f}s ({b['cpu_percent']:.0f}%)"
+        )
+
+
+async def wait_ready(url: str, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            try:
+                if (await client.get(url)).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"{url} did not become ready")
+
+
+async def spawn(args: argparse.Namespace, workdir: Path) -> list[subprocess.Popen]:
+    """Start a fake ComfyUI and the backend wired to it; returns both processes."""
+    backend_dir = Path(__file__).resolve().parent.parent
+    fake_port, backend_port = free_port(), free_port()
+    comfy_out = workdir / "comfyui-output"
+    fake_cmd = [
+        sys.executable, "-m", "benchmarks.fake_comfyui",
+        "--port", str(fake_port),
+        "--steps", str(args.steps),
+        "--step-latency", str(args.step_latency),
+        "--parallel", str(args.parallel),
+        "--fail-rate", str(args.fail_rate),
+        "--reject-rate", str(args.reject_rate),
+        "--ws-drop-rate", str(args.ws_drop_rate),
+        "--output-dir", str(comfy_out),
+    ]
+    env = {
+        **os.environ,
+        "COMFYUI_URL": f"http://127.0.0.1:{fake_port}",
+        "COMFYUI_OUTPUT_DIR": str(comfy_out),
+        "IMAGE_OUTPUT_DIR": str(workdir / "images"),
+        "BROKER_SOCKET": str(workdir / "broker.sock"),
+    }
+    # Admit the whole load unless the caller set limits explicitly
+    env.setdefault("SCHEDULER_MAX_QUEUE_DEPTH", str(args.users * 2))
+    env.setdefault("SCHEDULER_MAX_IN_FLIGHT", str(args.parallel * 2))
+    backend_cmd = [
+        sys.executable, "-m", "uvicorn", "main:app",
+        "--port", str(backend_port),
+        "--workers", str(args.workers),
+        "--log-level", "warning",
+    ]
+    # Per-request INFO logging would compete with the load for CPU
+    output = None if args.verbose else subprocess.DEVNULL
+    processes = [subprocess.Popen(fake_cmd, cwd=backend_dir, stdout=output, stderr=output)]
+    await wait_ready(f"http://127.0.0.1:{fake_port}/system_stats")
+    processes.append(
+        subprocess.Popen(backend_cmd, cwd=backend_dir, env=env, stdout=output, stderr=output)
+    )
+    await wait_ready(f"http://127.0.0.1:{backend_port}/api/health")
+    args.base_url = f"http://127.0.0.1:{backend_port}"
+    args.fake_url = f"http://127.0.0.1:{fake_port}"
+    args.backend_pid = processes[1].pid
+    return processes
+
+
+async def main_async(args: argparse.Namespace) -> dict:
+    processes = []
+    with tempfile.TemporaryDirectory(prefix="keyring-load-") as workdir:
+        try:
+            if args.spawn:
+                processes = await spawn(args, Path(workdir))
+            return await LoadTest(args).run(args.backend_pid)
+        finally:
+            for process in reversed(processes):
+                process.terminate()
+                process.wait(timeout=10)
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--base-url", default="http://127.0.0.1:8889")
+    parser.add_argument("--fake-url", default="", help="fake ComfyUI, for event lag")
+    parser.add_argument("--backend-pid", type=int, default=None)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--iterations", type=int, default=1, help="generations per user")
+    parser.add_argument("--ramp", type=float, default=2.0, help="seconds to start all users")
+    parser.add_argument("--timeout", type=float, default=600.0)
+    parser.add_argument("--json", default="", help="write the report to this file")
+    parser.add_argument("--max-p95", type=float, default=None, help="fail if total p95 exceeds (s)")
+    parser.add_argument("--max-error-rate", type=float, default=None)
+
+    spawn_group = parser.add_argument_group("--spawn: run a fake ComfyUI and the backend")
+    spawn_group.add_argument("--spawn", action="store_true")
+    spawn_group.add_argument("--workers", type=int, default=1, help="uvicorn workers")
+    spawn_group.add_argument("--verbose", action="store_true", help="show server output")
+    spawn_group.add_argument("--steps", type=int, default=10)
+    spawn_group.add_argument("--step-latency", type=float, default=0.02)
+    spawn_group.add_argument("--parallel", type=int, default=8, help="simulated GPUs")
+    spawn_group.add_argument("--fail-rate", type=float, default=0.0)
+    spawn_group.add_argument("--reject-rate", type=float, default=0.0)
+    spawn_group.add_argument("--ws-drop-rate", type=float, default=0.0)
+    return parser.parse_args(argv)
+
+
+def main():
+    args = parse_args()
+    report = asyncio.run(main_async(args))
+    print_report(report)
+    if args.json:
+        Path(args.json).write_text(json.dumps(report, indent=2))
+
+    failed = False
+    if args.max_p95 is not None and not report["stages"]["total"]["p95"] <= args.max_p95:
+        print(f"FAIL: total p95 above {args.max_p95}s")
+        failed = True
+    if args.max_error_rate is not None and report["error_rate"] > args.max_error_rate:
+        print(f"FAIL: error rate {report['error_rate']:.3f} above {args.max_error_rate}")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
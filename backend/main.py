@@ -1,17 +1,49 @@
 import logging
+from contextlib import asynccontextmanager
 
 from fastapi import FastAPI
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 
 from app.config import settings
-from app.routers import gacha, generate, status, images, choices
+from app.routers import gacha, generate, status, images, choices, metrics
+from app.services.comfyui_client import comfyui_client
+from app.services.render_cache import render_cache
+from app.services.prompt_builder import workflow_template
+from app.services.scheduler import scheduler
+from app.services.job_store import job_store
+from app.services.broker import broker
+from app.services.warmup import warmup
+from app.services.postprocess import postprocessor
+from app.services.hub import call_hub
 
 logging.basicConfig(
     level=logging.INFO,
     format="%(asctime)s [%(levelname)s] %(name)s: %(message)s",
 )
 
-app = FastAPI(title="Keyring Gacha API", version="0.1.0")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    workflow_template.refresh()
+    if settings.broker_socket:
+        broker.start()
+    await comfyui_client.start()
+    warmup.start()
+    postprocessor.start()
+    job_store.start()
+    try:
+        yield
+    finally:
+        await warmup.close()
+        await postprocessor.close()
+        await broker.close()
+        await scheduler.close()
+        await comfyui_client.close()
+        await job_store.close()
+
+
+app = FastAPI(title="Keyring Gacha API", version="0.1.0", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -26,14 +58,38 @@ app.include_router(generate.router, prefix="/api")
 app.include_router(status.router, prefix="/api")
 app.include_router(images.router, prefix="/api")
 app.include_router(choices.router, prefix="/api")
+app.include_router(metrics.router, prefix="/api")
 
 
 @app.get("/api/health")
 async def health():
-    from app.services.comfyui_client import comfyui_client
-
     comfyui_ok = await comfyui_client.is_healthy()
     return {
         "status": "ok",
+        # Only the hub's scheduler and caches hold work; see app/services/broker.py
+        "broker": broker.role,
         "comfyui": "connected" if comfyui_ok else "unavailable",
+        "nodes": comfyui_client.status(),
+        "render_cache": render_cache.stats(),
+        "queue": {
+            "depth": scheduler.depth,
+            "in_flight": scheduler.in_flight,
+            "affinity_hits": scheduler.affinity_hits,
+            "cached_nodes": comfyui_client.cached_nodes,
+        },
     }
+
+
+async def readiness(payload: dict) -> dict:
+    # Answered by the hub, the worker that warms nodes and submits renders
+    return {"ready": comfyui_client.ready, "nodes": warmup.status()}
+
+
+broker.serve("ready", readiness)
+
+
+@app.get("/api/ready")
+async def ready():
+    """Readiness: 200 once a ComfyUI node is reachable and warmed up, else 503."""
+    result = await call_hub("ready", {})
+    return JSONResponse(result, status_code=200 if result["ready"] else 503)
@@ -3,7 +3,9 @@ import type {
   GenerateRequest,
   GenerateResponse,
   StatusEvent,
+  StatusSocketMessage,
   ChoicesResponse,
+  CancelResponse,
 } from '@/types/api'
 
 const API_BASE = '/api'
@@ -30,6 +32,15 @@ export async function submitGenerate(request: GenerateRequest): Promise<Generate
   })
 }
 
+export async function cancelGenerate(generationId: string): Promise<CancelResponse> {
+  return fetchJson<CancelResponse>(`/generate/${generationId}/cancel`, { method: 'POST' })
+}
+
+// Fire-and-forget variant that survives the page being closed
+export function cancelGenerateOnUnload(generationId: string): void {
+  navigator.sendBeacon(`${API_BASE}/generate/${generationId}/cancel`)
+}
+
 export async function getChoices(): Promise<ChoicesResponse> {
   return fetchJson<ChoicesResponse>('/choices')
 }
@@ -44,7 +55,7 @@ export function subscribeToStatus(
   eventSource.onmessage = (e) => {
     const data: StatusEvent = JSON.parse(e.data)
     onEvent(data)
-    if (data.status === 'complete' || data.status === 'error') {
+    if (data.status === 'complete' || data.status === 'error' || data.status === 'cancelled') {
       eventSource.close()
     }
   }
@@ -56,3 +67,60 @@ export function subscribeToStatus(
 
   return eventSource
 }
+
+export interface StatusSocket {
+  subscribe: (generationIds: string[]) => void
+  unsubscribe: (generationIds: string[]) => void
+  close: () => void
+}
+
+export function openStatusSocket(
+  onEvent: (generationId: string, event: StatusEvent) => void,
+  onError?: (error: Event) => void,
+): StatusSocket {
+  const protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:'
+  const socket = new WebSocket(`${protocol}//${window.location.host}${API_BASE}/ws/status`)
+  const events = new Map<string, StatusEvent>()
+  const pending: string[] = []
+
+  const send = (action: string, ids: string[]) => {
+    if (socket.readyState === WebSocket.OPEN) {
+      socket.send(JSON.stringify({ action, ids }))
+    } else if (action === 'subscribe') {
+      pending.push(...ids)
+    }
+  }
+
+  socket.onopen = () => {
+    if (pending.length) send('subscribe', pending.splice(0))
+  }
+
+  socket.onmessage = (e) => {
+    const message: StatusSocketMessage = JSON.parse(e.data)
+    for (const [id, delta] of Object.entries(message.updates ?? {})) {
+      const event = { ...events.get(id) } as Record<string, unknown>
+      for (const [key, value] of Object.entries(delta)) {
+        if (value === null) delete event[key]
+        else event[key] = value
+      }
+      const merged = event as unknown as StatusEvent
+      if (merged.status === 'complete' || merged.status === 'error' || merged.status === 'cancelled') {
+        events.delete(id)
+      } else {
+        events.set(id, merged)
+      }
+      onEvent(id, merged)
+    }
+  }
+
+  socket.onerror = (e) => onError?.(e)
+
+  return {
+    subscribe: (ids) => send('subscribe', ids),
+    unsubscribe: (ids) => {
+      ids.forEach((id) => events.delete(id))
+      send('unsubscribe', ids)
+    },
+    close: () => socket.close(),
+  }
+}
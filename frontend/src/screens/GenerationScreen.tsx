@@ -1,7 +1,7 @@
-import { useEffect } from 'react'
+import { useEffect, useState } from 'react'
 import { motion } from 'framer-motion'
 import { useGachaStore } from '@/stores/useGachaStore'
-import { subscribeToStatus } from '@/api/client'
+import { subscribeToStatus, cancelGenerateOnUnload } from '@/api/client'
 import { ProgressBar } from '@/components/ProgressBar'
 import { KeyringResult } from '@/components/KeyringResult'
 import { MiniGameSelector } from '@/minigames/MiniGameSelector'
@@ -18,15 +18,23 @@ export function GenerationScreen() {
     setImageUrl,
     reset,
   } = useGachaStore()
+  const [queuePosition, setQueuePosition] = useState(0)
+  const [previewUrl, setPreviewUrl] = useState<string | null>(null)
+  const [estimatedSeconds, setEstimatedSeconds] = useState<number | null>(null)
 
   useEffect(() => {
     if (!generationId) return
 
+    let finished = false
     const eventSource = subscribeToStatus(
       generationId,
       (event) => {
+        finished = event.status === 'complete' || event.status === 'error' || event.status === 'cancelled'
         setGenerationStatus(event.status)
         setGenerationProgress(event.progress)
+        setQueuePosition(event.queue_position ?? 0)
+        if (event.preview_url) setPreviewUrl(event.preview_url)
+        setEstimatedSeconds(event.estimated_seconds ?? null)
         if (event.status === 'complete' && event.image_url) {
           playComplete()
           setImageUrl(event.image_url)
@@ -41,7 +49,16 @@ export function GenerationScreen() {
       },
     )
 
-    return () => eventSource.close()
+    // Closing or reloading the tab abandons the render; free the GPU for others
+    const onPageHide = () => {
+      if (!finished) cancelGenerateOnUnload(generationId)
+    }
+    window.addEventListener('pagehide', onPageHide)
+
+    return () => {
+      window.removeEventListener('pagehide', onPageHide)
+      eventSource.close()
+    }
   }, [generationId, setGenerationStatus, setGenerationProgress, setImageUrl])
 
   const handleRestart = () => {
@@ -56,7 +73,7 @@ export function GenerationScreen() {
     )
   }
 
-  if (generationStatus === 'error') {
+  if (generationStatus === 'error' || generationStatus === 'cancelled') {
     return (
       <div className="generation-screen">
         <div className="error-container">
@@ -77,6 +94,13 @@ export function GenerationScreen() {
   return (
     <div className="generation-screen">
       <h2 className="screen-title">키링 생성 중...</h2>
+      {queuePosition > 0 && (
+        <p className="generation-hint">대기열 {queuePosition}번째</p>
+      )}
+      {estimatedSeconds !== null && (
+        <p className="generation-hint">약 {Math.max(1, Math.ceil(estimatedSeconds))}초 남음</p>
+      )}
+      {previewUrl && <img className="generation-preview" src={previewUrl} alt="" />}
       <ProgressBar progress={generationProgress} />
       <p className="generation-hint">생성되는 동안 미니게임을 즐겨보세요!</p>
       <MiniGameSelector />
@@ -8,19 +8,50 @@ export interface GenerateRequest {
   shape: string
   pattern: string
   color: string
+  seed?: number
+  cache?: boolean
+  variants?: number
+  tier?: RenderTier
 }
 
+export type RenderTier = 'preview' | 'standard' | 'high'
+
 export interface GenerateResponse {
   generation_id: string
+  queue_position: number
+  // May be cheaper than requested while the render queue is long
+  tier?: RenderTier
+  // Predicted seconds until the image is ready; absent before any render finished
+  estimated_seconds?: number
+}
+
+export interface CancelResponse {
+  generation_id: string
+  status: string
 }
 
 export interface StatusEvent {
-  status: 'queued' | 'generating' | 'complete' | 'error'
+  status: 'queued' | 'generating' | 'complete' | 'error' | 'cancelled'
   progress: number
   step?: number
   total_steps?: number
+  queue_position?: number
   image_url?: string
+  image_urls?: string[]
+  // Small JPEGs, set shortly after completion once post-processing has run
+  thumbnail_url?: string
+  thumbnail_urls?: string[]
+  // Newest sampler preview while generating; changes with every frame
+  preview_url?: string
+  tier?: RenderTier
+  estimated_seconds?: number
   message?: string
 }
 
+// /api/ws/status: full StatusEvent on first report, then changed fields (null = removed)
+export interface StatusSocketMessage {
+  updates?: Record<string, Partial<Record<keyof StatusEvent, unknown>>>
+  error?: string
+}
+
 export interface ChoicesResponse extends ChoicesMetadata {}
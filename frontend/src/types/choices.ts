@@ -36,4 +36,4 @@ export type Screen =
 
 export type GachaType = 'shell' | 'machine' | 'roulette'
 
-export type GenerationStatus = 'idle' | 'queued' | 'generating' | 'complete' | 'error'
+export type GenerationStatus = 'idle' | 'queued' | 'generating' | 'complete' | 'error' | 'cancelled'